@@ -6,49 +6,154 @@
 """
 import sys
 import os
-import argparse
 import time
+import types
 import logging
-import requests
+import logging.handlers
+import queue
+import atexit
+import pathlib
+import functools
+import re
 import json
+from importlib.resources import files
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson заметно быстрее стандартного json; если он не установлен, используем json
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj) -> bytes:
+        """Сериализует объект в JSON (UTF-8 байты)."""
+        return orjson.dumps(obj)
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        """Сериализует объект в JSON (UTF-8 байты)."""
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
 
 print("🚀 Скрипт init_agents.py запущен!")
 
-# Добавляем корневой каталог в путь импорта
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Добавляем корневой каталог в путь импорта (однократно)
+_ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+if _ROOT_DIR not in sys.path:
+    sys.path.append(_ROOT_DIR)
+
+# Настраиваем логирование: вызовы логгера только кладут запись в очередь,
+# а запись в консоль и файл выполняет отдельный поток QueueListener
+_log_formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+_log_handlers = [logging.StreamHandler(), logging.FileHandler("agents_init.log")]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+
+_log_queue = queue.SimpleQueue()
+_root_logger = logging.getLogger()
+_root_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_root_logger.setLevel(logging.INFO)
+
+_log_listener = logging.handlers.QueueListener(_log_queue, *_log_handlers)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
-# Настраиваем логирование
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("agents_init.log")
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Общая HTTP-сессия с пулом соединений: повторные запросы к LM Studio
+# переиспользуют уже установленное соединение (keep-alive).
+# Создается при первом обращении, чтобы не импортировать requests заранее.
+_SESSION = None
+
+def _get_session():
+    """Возвращает общую HTTP-сессию, создавая ее при первом вызове."""
+    global _SESSION
+    if _SESSION is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+        session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+        _SESSION = session
+    return _SESSION
+
+# Таймауты запросов к LM Studio: (подключение, чтение) в секундах
+LM_STUDIO_TIMEOUT = (3, 10)
+
+# Тестовый запрос к LM Studio сериализуется один раз при загрузке модуля
+_PROBE_HEADERS = {"Content-Type": "application/json"}
+_PROBE_BODY = json.dumps({
+    "model": "local-model",
+    "messages": [{"role": "user", "content": "Привет! Это тестовое сообщение."}],
+    "temperature": 0.7,
+    "max_tokens": 50
+}).encode("utf-8")
+
+# Предложение: непустой фрагмент текста до точки включительно или до конца текста
+_SENT_RE = re.compile(r'[^.]+(?:\.|$)')
+
+def _split_sentences(text):
+    """Разбивает текст на предложения; хвост без точки дополняется точкой."""
+    sentences = []
+    for fragment in _SENT_RE.findall(text):
+        fragment = fragment.strip()
+        if fragment:
+            sentences.append(fragment if fragment.endswith('.') else fragment + '.')
+    return sentences
+
+def _dir_entries(path):
+    """Возвращает множество имен в каталоге за один проход os.scandir."""
+    try:
+        with os.scandir(path) as entries:
+            return {entry.name for entry in entries}
+    except FileNotFoundError:
+        return set()
+
+def _ensure_scaffold(dirpath, entries):
+    """Создает каталог и недостающие в нем файлы, проверяя наличие одним os.scandir.
+    
+    entries — словарь {имя файла: содержимое в байтах или функция, возвращающая байты}.
+    Существующие файлы не перезаписываются, новые записываются атомарно.
+    Возвращает множество имен созданных файлов.
+    """
+    path = pathlib.Path(dirpath)
+    present = _dir_entries(path)
+    if not present:
+        path.mkdir(parents=True, exist_ok=True)
+    
+    created = set()
+    for name, content in entries.items():
+        if name not in present:
+            _atomic_write_bytes(path / name, content() if callable(content) else content)
+            created.add(name)
+    return created
+
+def _atomic_write_bytes(file_path, payload):
+    """Атомарно записывает файл: пишет во временный файл и подменяет им целевой.
+    
+    Читатели никогда не увидят частично записанный файл.
+    """
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb', buffering=1 << 16) as file:
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, file_path)
+
 def check_lm_studio_connection():
     """Проверяет подключение к LM Studio."""
     try:
         from app.config import LLM_MODEL_PATH
         
-        headers = {"Content-Type": "application/json"}
-        data = {
-            "model": "local-model",
-            "messages": [{"role": "user", "content": "Привет! Это тестовое сообщение."}],
-            "temperature": 0.7,
-            "max_tokens": 50
-        }
-        
         logger.info(f"Проверка соединения с LM Studio по адресу: {LLM_MODEL_PATH}")
         
-        # Пробуем запрос с большим таймаутом для первого соединения
-        response = requests.post(
+        # Короткий таймаут на подключение, чтобы быстро выявлять недоступный сервер
+        response = _get_session().post(
             f"{LLM_MODEL_PATH}/chat/completions", 
-            headers=headers, 
-            json=data,
-            timeout=10
+            headers=_PROBE_HEADERS, 
+            data=_PROBE_BODY,
+            timeout=LM_STUDIO_TIMEOUT
         )
         
         if response.status_code == 200:
@@ -72,12 +177,16 @@ def initialize_knowledge_base():
     try:
         logger.info("Начало создания расширенной базы знаний...")
         
+        # Читаем содержимое каталога JSONL файлов одним проходом
+        present = _dir_entries("app/knowledge/jsonl")
+        
         # Создаем директорию для JSONL файлов, если она не существует
-        os.makedirs("app/knowledge/jsonl", exist_ok=True)
+        if not present:
+            os.makedirs("app/knowledge/jsonl", exist_ok=True)
         
         # Создаем базовый JSONL файл, если он еще не существует
         basic_knowledge_file = "app/knowledge/jsonl/risk_knowledge.jsonl"
-        if not os.path.exists(basic_knowledge_file):
+        if "risk_knowledge.jsonl" not in present:
             logger.info(f"Создание базового файла базы знаний: {basic_knowledge_file}")
             create_basic_knowledge_file(basic_knowledge_file)
         
@@ -155,10 +264,9 @@ def create_basic_knowledge_file(file_path):
         }
     ]
     
-    # Записываем базовые элементы в JSONL файл
-    with open(file_path, 'w', encoding='utf-8') as file:
-        for item in knowledge_items:
-            file.write(json.dumps(item, ensure_ascii=False) + '\n')
+    # Записываем базовые элементы в JSONL файл одной операцией записи
+    payload = b"\n".join(_json_dumps(item) for item in knowledge_items) + b"\n"
+    _atomic_write_bytes(file_path, payload)
     
     logger.info(f"Создан базовый файл базы знаний с {len(knowledge_items)} элементами")
 
@@ -166,11 +274,8 @@ def create_enhanced_knowledge_base(source_path, target_path):
     """Создает расширенную базу знаний на основе существующей базы."""
     try:
         # Загружаем существующую базу знаний
-        knowledge_items = []
-        with open(source_path, 'r', encoding='utf-8') as file:
-            for line in file:
-                if line.strip():
-                    knowledge_items.append(json.loads(line.strip()))
+        with open(source_path, 'rb', buffering=1 << 16) as file:
+            knowledge_items = [_json_loads(line) for line in file if line.strip()]
         
         # Создаем расширенную базу знаний
         enhanced_items = []
@@ -188,17 +293,20 @@ def create_enhanced_knowledge_base(source_path, target_path):
             # Добавляем уровни сложности для объяснений
             difficulty = metadata.get('difficulty', 'средний')
             
+            # Разбиваем ответ на предложения один раз для всех уровней
+            sentences = _split_sentences(response)
+            
             # Создаем примеры для разных уровней сложности
             examples = {
                 'basic': {
-                    'explanation': response.split('.')[0] + '.',
+                    'explanation': sentences[0] if sentences else response,
                     'analogy': "Это как подготовка к любым неожиданностям, чтобы бизнес не останавливался",
                     'example': "Например, при сбое в работе ИТ-систем банка нужно быстро восстановить работу, чтобы клиенты не пострадали"
                 },
                 'intermediate': {
-                    'explanation': '.'.join(response.split('.')[:2]) + '.',
+                    'explanation': ' '.join(sentences[:2]) if sentences else response,
                     'practical_example': "Банк создал резервный дата-центр в другом городе, чтобы в случае аварии в основном центре все критические системы продолжили работу",
-                    'important_points': [s.strip() + '.' for s in response.split('.')[:3] if s.strip()]
+                    'important_points': sentences[:3]
                 },
                 'advanced': {
                     'explanation': response,
@@ -218,10 +326,9 @@ def create_enhanced_knowledge_base(source_path, target_path):
             
             enhanced_items.append(enhanced_item)
         
-        # Сохраняем расширенную базу знаний
-        with open(target_path, 'w', encoding='utf-8') as file:
-            for item in enhanced_items:
-                file.write(json.dumps(item, ensure_ascii=False) + '\n')
+        # Сохраняем расширенную базу знаний одной операцией записи
+        payload = b"\n".join(_json_dumps(item) for item in enhanced_items) + b"\n"
+        _atomic_write_bytes(target_path, payload)
         
         logger.info(f"Расширенная база знаний создана: {target_path}")
         logger.info(f"Количество элементов: {len(enhanced_items)}")
@@ -236,23 +343,15 @@ def check_rag_functionality():
     try:
         logger.info("Проверка функциональности RAG...")
         
-        # Создаем директорию app/knowledge, если она не существует
-        os.makedirs("app/knowledge", exist_ok=True)
+        # Создаем каталог app/knowledge с __init__.py и rag_simple.py, если их нет
+        created = _ensure_scaffold("app/knowledge", {
+            "__init__.py": '"""Модуль для работы с базой знаний."""\n'.encode('utf-8'),
+            "rag_simple.py": lambda: _load_template("rag_simple.py.tpl"),
+        })
+        if "rag_simple.py" in created:
+            logger.info(f"Создан файл rag_simple.py для простой реализации RAG")
         
-        # Создаем пустой файл __init__.py в директории, если его нет
-        init_file = "app/knowledge/__init__.py"
-        if not os.path.exists(init_file):
-            with open(init_file, 'w', encoding='utf-8') as f:
-                f.write('"""Модуль для работы с базой знаний."""\n')
-        
-        # Создаем файл rag_simple.py, если его нет
-        rag_simple_file = "app/knowledge/rag_simple.py"
-        if not os.path.exists(rag_simple_file):
-            create_rag_simple_file(rag_simple_file)
-        
-        # Импортируем функции
-        # Используем относительный импорт для избежания проблем с путями
-        sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+        # Импортируем функции (корневой каталог уже добавлен в путь импорта)
         from app.knowledge.rag_simple import generate_questions, convert_questions_for_db
         
         # Тестируем генерацию вопросов
@@ -283,277 +382,23 @@ def check_rag_functionality():
         logger.error(f"❌ Ошибка при проверке функциональности RAG: {e}")
         return False
 
-def create_rag_simple_file(file_path):
-    """Создает файл rag_simple.py с простой реализацией RAG."""
-    code = '''"""
-Модуль для работы с RAG (упрощенная версия для локального тестирования).
-Используется для генерации вопросов на основе базы знаний без использования LLM.
-"""
-import json
-import random
-import os
-from typing import List, Dict, Any
-
-# Путь к базе знаний
-RISK_KNOWLEDGE_PATH = "app/knowledge/jsonl/risk_knowledge.jsonl"
-
-def load_knowledge_base(path: str = RISK_KNOWLEDGE_PATH) -> List[Dict[str, Any]]:
-    """Загружает базу знаний из JSONL файла."""
-    knowledge_base = []
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():  # Проверяем, что строка не пустая
-                    knowledge_base.append(json.loads(line.strip()))
-        return knowledge_base
-    except FileNotFoundError:
-        print(f"Файл не найден: {path}")
-        return []
-    except json.JSONDecodeError:
-        print(f"Ошибка декодирования JSON в файле: {path}")
-        return []
-
-def generate_questions(
-    topic: str, 
-    difficulty: str = "средний", 
-    num_questions: int = 3
-) -> List[Dict[str, Any]]:
-    """Генерирует вопросы из базы знаний."""
-    # Загружаем базу знаний
-    knowledge_base = load_knowledge_base()
-    if not knowledge_base:
-        print("Ошибка: база знаний пуста")
-        return []
-    
-    # Фильтруем базу знаний по теме и сложности
-    filtered_kb = [
-        item for item in knowledge_base 
-        if (
-            item.get('metadata', {}).get('topic', '').startswith(topic.split('_')[0]) and 
-            item.get('metadata', {}).get('difficulty', '') == difficulty
-        )
-    ]
-    
-    # Если не нашли подходящих элементов, используем все элементы базы
-    if not filtered_kb:
-        filtered_kb = knowledge_base
-    
-    # Создаем вопросы
-    questions = []
-    selected_items = []
-    
-    # Выбираем случайные элементы без повторений
-    if len(filtered_kb) >= num_questions:
-        selected_items = random.sample(filtered_kb, num_questions)
-    else:
-        selected_items = filtered_kb.copy()
-        remaining = [item for item in knowledge_base if item not in selected_items]
-        if remaining:
-            additional_items = random.sample(remaining, min(num_questions - len(selected_items), len(remaining)))
-            selected_items.extend(additional_items)
-    
-    # Создаем вопросы на основе выбранных элементов
-    for item in selected_items:
-        question_text = item['prompt']
-        correct_answer = item['response']
-        
-        # Формируем краткий ответ (первое предложение)
-        short_answer = correct_answer.split('.')[0] + '.'
-        
-        # Генерируем неправильные варианты, используя другие ответы из базы
-        other_answers = [
-            kb_item['response'].split('.')[0] + '.' 
-            for kb_item in knowledge_base 
-            if kb_item['response'] != correct_answer
-        ]
-        
-        # Выбираем случайные неправильные ответы
-        wrong_answers = random.sample(other_answers, min(3, len(other_answers)))
-        while len(wrong_answers) < 3:
-            wrong_answers.append("Недостаточно информации для ответа")
-        
-        # Формируем варианты ответов
-        options = [short_answer] + wrong_answers
-        random.shuffle(options)
-        
-        # Определяем правильный ответ
-        correct_index = options.index(short_answer)
-        correct_letter = chr(65 + correct_index)  # A, B, C или D
-        
-        question_data = {
-            "question": question_text,
-            "options": options,
-            "correct_answer": correct_letter,
-            "explanation": correct_answer
-        }
-        
-        questions.append(question_data)
-    
-    return questions
-
-def convert_questions_for_db(questions: List[Dict[str, Any]], lesson_id: int) -> List[Dict[str, Any]]:
-    """Преобразует сгенерированные вопросы в формат для сохранения в базе данных."""
-    db_questions = []
-    
-    for question in questions:
-        db_question = {
-            "lesson_id": lesson_id,
-            "text": question["question"],
-            "options": json.dumps(question["options"], ensure_ascii=False),
-            "correct_answer": question["correct_answer"],
-            "explanation": question.get("explanation", "")
-        }
-        db_questions.append(db_question)
-    
-    return db_questions
-'''
-    
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(code.strip())
-    
-    logger.info(f"Создан файл rag_simple.py для простой реализации RAG")
+@functools.lru_cache(maxsize=None)
+def _load_template(name):
+    """Читает шаблон генерируемого модуля из init_agents_templates (содержимое в байтах)."""
+    return files("init_agents_templates").joinpath(name).read_bytes()
 
 def initialize_langchain_integration():
     """Создает файл интеграции с LangChain."""
-    # Создаем директорию app/langchain, если она не существует
-    os.makedirs("app/langchain", exist_ok=True)
-    
-    # Создаем пустой файл __init__.py в директории, если его нет
-    init_file = "app/langchain/__init__.py"
-    if not os.path.exists(init_file):
-        with open(init_file, 'w', encoding='utf-8') as f:
-            f.write('"""Модуль для работы с LangGraph и агентами."""\n')
-    
-    # Создаем файл integration.py, если его нет
-    integration_file = "app/langchain/integration.py"
-    if not os.path.exists(integration_file):
-        create_integration_file(integration_file)
+    # Создаем каталог app/langchain с __init__.py и integration.py, если их нет
+    created = _ensure_scaffold("app/langchain", {
+        "__init__.py": '"""Модуль для работы с LangGraph и агентами."""\n'.encode('utf-8'),
+        "integration.py": lambda: _load_template("integration.py.tpl"),
+    })
+    if "integration.py" in created:
         logger.info(f"Создан файл integration.py для интеграции агентов")
-        return True
     else:
         logger.info(f"Файл integration.py уже существует")
-        return True
-
-def create_integration_file(file_path):
-    """Создает файл integration.py с базовой интеграцией агентов."""
-    code = '''"""
-Модуль для интеграции LangGraph агентов с Telegram ботом.
-"""
-import logging
-import asyncio
-import json
-from typing import Dict, Any, List, Optional, Tuple
-
-from app.config import LLM_MODEL_PATH
-
-# Настройка логирования
-logger = logging.getLogger(__name__)
-
-class AgentIntegration:
-    """Класс для интеграции агентов LangGraph с Telegram ботом."""
-    
-    def __init__(self):
-        """Инициализация интеграции агентов."""
-        # Флаг доступности LLM
-        self.llm_available = False
-        
-        # Создаем заглушки для агентов
-        self.knowledge_agent = self.KnowledgeAgentStub()
-        self.explanation_agent = self.ExplanationAgentStub()
-        self.query_agent = self.QueryAgentStub()
-    
-    class KnowledgeAgentStub:
-        """Заглушка для агента оценки знаний."""
-        def assess(self, question, user_answer, correct_answer):
-            """Оценивает ответ пользователя."""
-            is_correct = user_answer.lower() in correct_answer.lower()
-            return {
-                "score": 100 if is_correct else 0,
-                "explanation": "Ответ верный!" if is_correct else "Ответ неверный."
-            }
-    
-    class ExplanationAgentStub:
-        """Заглушка для агента объяснения."""
-        def explain(self, topic, concept, user_level, misconceptions):
-            """Объясняет концепцию."""
-            return "Это объяснение было бы адаптировано под ваш уровень знаний, если бы LLM был доступен."
-    
-    class QueryAgentStub:
-        """Заглушка для агента ответов на запросы."""
-        def answer_query(self, query, context):
-            """Отвечает на запрос."""
-            return "К сожалению, я не могу дать подробный ответ на этот вопрос сейчас. Попробуйте задать более конкретный вопрос или обратитесь к материалам урока."
-    
-    async def assess_answer(self, question: str, user_answer: str, correct_answer: str) -> Dict[str, Any]:
-        """Оценивает ответ пользователя с помощью агента оценки знаний."""
-        if not self.llm_available:
-            # Простая оценка без агента
-            is_correct = user_answer == correct_answer
-            return {
-                "score": 100 if is_correct else 0,
-                "explanation": "Ответ верный!" if is_correct else "Ответ неверный."
-            }
-        
-        try:
-            # Используем агента для оценки
-            assessment = self.knowledge_agent.assess(question, user_answer, correct_answer)
-            return assessment
-        except Exception as e:
-            logger.error(f"Ошибка при оценке ответа агентом: {e}")
-            # Запасной вариант
-            is_correct = user_answer == correct_answer
-            return {
-                "score": 100 if is_correct else 0,
-                "explanation": "Ответ верный!" if is_correct else "Ответ неверный."
-            }
-    
-    async def generate_adaptive_explanation(
-        self, 
-        topic: str, 
-        concept: str, 
-        user_level: int, 
-        misconceptions: List[str]
-    ) -> str:
-        """Генерирует адаптивное объяснение с учетом уровня пользователя и его заблуждений."""
-        if not self.llm_available:
-            # Простое объяснение без агента
-            return "К сожалению, не удалось сгенерировать детальное объяснение. Рекомендуем еще раз изучить материал урока."
-        
-        try:
-            # Используем агента для генерации объяснения
-            explanation = self.explanation_agent.explain(topic, concept, user_level, misconceptions)
-            return explanation
-        except Exception as e:
-            logger.error(f"Ошибка при генерации объяснения агентом: {e}")
-            # Запасной вариант
-            return "К сожалению, не удалось сгенерировать детальное объяснение. Рекомендуем еще раз изучить материал урока."
-    
-    async def answer_user_query(self, query: str, context: str) -> str:
-        """Отвечает на запрос пользователя с помощью агента запросов."""
-        if not self.llm_available:
-            # Простой ответ без агента
-            return "К сожалению, не могу ответить на этот вопрос сейчас. Попробуйте задать более конкретный вопрос или обратитесь к материалам урока."
-        
-        try:
-            # Используем агента для ответа
-            answer = self.query_agent.answer_query(query, context)
-            return answer
-        except Exception as e:
-            logger.error(f"Ошибка при ответе на запрос агентом: {e}")
-            # Запасной вариант
-            return "К сожалению, не могу ответить на этот вопрос сейчас. Попробуйте задать более конкретный вопрос или обратитесь к материалам урока."
-    
-    async def start_learning_session(self, user_id: int, lesson_id: int) -> Dict[str, Any]:
-        """Запускает сессию обучения с использованием LangGraph."""
-        # В режиме заглушки всегда используем стандартный поток
-        return {"use_standard_flow": True}
-
-# Создаем синглтон для интеграции агентов
-agent_integration = AgentIntegration()
-'''
-    
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(code.strip())
+    return True
 
 def check_requirements():
     """Проверяет необходимые зависимости."""
@@ -575,21 +420,28 @@ def check_requirements():
         
         missing_packages = []
         
+        import importlib.metadata
+        
+        # Собираем имена установленных дистрибутивов за один проход,
+        # не импортируя сами пакеты
+        installed = {
+            (dist.metadata["Name"] or "").lower().replace("_", "-")
+            for dist in importlib.metadata.distributions()
+        }
+        
         # Проверяем основные библиотеки
         for package in required_packages:
-            try:
-                __import__(package.replace("-", "_"))
+            if package in installed:
                 logger.info(f"✅ Библиотека {package} установлена")
-            except ImportError:
+            else:
                 missing_packages.append(package)
                 logger.error(f"❌ Библиотека {package} не установлена")
         
         # Проверяем библиотеки для агентов
         for package in agent_packages:
-            try:
-                __import__(package.replace("-", "_"))
+            if package in installed:
                 logger.info(f"✅ Библиотека {package} установлена")
-            except ImportError:
+            else:
                 logger.warning(f"⚠️ Библиотека {package} не установлена (требуется для полной функциональности агентов)")
         
         # Выводим рекомендации по установке недостающих библиотек
@@ -604,26 +456,31 @@ def check_requirements():
         logger.error(f"❌ Ошибка при проверке зависимостей: {e}")
         return False
 
-def check_database():
-    """Проверяет подключение к базе данных."""
+def check_database(initialize=False):
+    """Проверяет подключение к базе данных.
+    
+    Схема создается (init_db) только при initialize=True (--init-db, --check-all
+    и запуск без аргументов); --check-db лишь открывает соединение и читает список таблиц.
+    """
     try:
         logger.info("Проверка подключения к базе данных...")
         
         # Импортируем функции
-        from app.database.models import get_db, init_db
+        from sqlalchemy import inspect, text
+        from app.database.models import engine, init_db
         
-        # Инициализируем базу данных
-        init_db()
+        # Инициализируем базу данных, если не запрошена только проверка
+        if initialize:
+            init_db()
         
-        # Пытаемся получить соединение с базой данных
-        db = get_db()
+        # Проверяем, что база данных доступна
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            table_names = inspect(conn).get_table_names()
         
-        if db:
-            logger.info("✅ Соединение с базой данных установлено успешно")
-            return True
-        else:
-            logger.error("❌ Не удалось подключиться к базе данных")
-            return False
+        logger.info("✅ Соединение с базой данных установлено успешно")
+        logger.info(f"Таблиц в базе данных: {len(table_names)}")
+        return True
     except Exception as e:
         logger.error(f"❌ Ошибка при проверке подключения к базе данных: {e}")
         return False
@@ -649,30 +506,22 @@ def check_bot_token():
         logger.error(f"❌ Ошибка при проверке токена Telegram бота: {e}")
         return False
 
-def run_checks(args):
-    """Запускает все проверки и инициализацию."""
-    logger.info("=" * 50)
-    logger.info("Запуск проверок и инициализации агентов")
-    logger.info("=" * 50)
-    
-    results = {}
-    
-    # Проверка зависимостей
-    if args.check_all or args.check_deps:
-        results["dependencies"] = check_requirements()
-    
-    # Проверка токена бота
-    if args.check_all or args.check_token:
-        results["token"] = check_bot_token()
-    
-    # Проверка базы данных
-    if args.check_all or args.check_db:
-        results["database"] = check_database()
-    
-    # Проверка подключения к LM Studio
+def _run_soft_checks(args, results):
+    """Выполняет некритичные проверки и шаги инициализации, дополняя results."""
+    # Проверки базы данных и LM Studio независимы и ограничены
+    # вводом-выводом, поэтому выполняем их параллельно
+    checks = {}
+    if args.check_all or args.check_db or args.init_db:
+        checks["database"] = functools.partial(check_database, initialize=args.check_all or args.init_db)
     if args.check_all or args.check_lm_studio:
-        results["lm_studio"] = check_lm_studio_connection()
+        checks["lm_studio"] = check_lm_studio_connection
+    
+    if checks:
+        with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+            futures = {name: executor.submit(check) for name, check in checks.items()}
+            results.update((name, future.result()) for name, future in futures.items())
     
+    # Шаги инициализации пишут в общие каталоги app/, поэтому идут последовательно
     # Инициализация базы знаний
     if args.check_all or args.init_knowledge:
         results["knowledge_base"] = initialize_knowledge_base()
@@ -684,6 +533,26 @@ def run_checks(args):
     # Инициализация интеграции с агентами
     if args.check_all or args.init_agents:
         results["integration"] = initialize_langchain_integration()
+
+def run_checks(args):
+    """Запускает все проверки и инициализацию."""
+    logger.info("=" * 50)
+    logger.info("Запуск проверок и инициализации агентов")
+    logger.info("=" * 50)
+    
+    results = {}
+    
+    # Критичные проверки дешевы и выполняются первыми: без токена
+    # и зависимостей бот все равно не запустится
+    if args.check_all or args.check_token:
+        results["token"] = check_bot_token()
+    if args.check_all or args.check_deps:
+        results["dependencies"] = check_requirements()
+    
+    if args.strict and not all(results.values()):
+        logger.error("❌ Критичные проверки не пройдены, остальные проверки пропущены (--strict)")
+    else:
+        _run_soft_checks(args, results)
     
     # Выводим итоговый отчет
     logger.info("=" * 50)
@@ -719,24 +588,44 @@ def run_checks(args):
     
     return all_success
 
-def main():
-    """Основная функция для запуска скрипта."""
+# Флаги командной строки: (флаг, описание)
+_CLI_FLAGS = (
+    ("--check-all", "Запустить все проверки и инициализацию"),
+    ("--check-deps", "Проверить зависимости"),
+    ("--check-token", "Проверить токен Telegram бота"),
+    ("--check-db", "Проверить подключение к базе данных"),
+    ("--init-db", "Создать таблицы и данные по умолчанию в базе данных"),
+    ("--check-lm-studio", "Проверить подключение к LM Studio"),
+    ("--check-rag", "Проверить функциональность RAG"),
+    ("--init-knowledge", "Инициализировать базу знаний"),
+    ("--init-agents", "Инициализировать интеграцию агентов"),
+    ("--strict", "Пропустить остальные проверки, если не найден токен или зависимости"),
+)
+_CLI_FLAG_NAMES = frozenset(flag for flag, _ in _CLI_FLAGS)
+
+def parse_args(argv):
+    """Разбирает аргументы; argparse строится только для --help и ошибочного ввода."""
+    if all(arg in _CLI_FLAG_NAMES for arg in argv):
+        # Быстрый путь: только известные флаги без значений
+        return types.SimpleNamespace(**{
+            flag[2:].replace("-", "_"): flag in argv for flag, _ in _CLI_FLAGS
+        })
+    
+    import argparse
     parser = argparse.ArgumentParser(description="Инициализация и проверка агентов для Telegram бота")
     
     # Добавляем аргументы командной строки
-    parser.add_argument("--check-all", action="store_true", help="Запустить все проверки и инициализацию")
-    parser.add_argument("--check-deps", action="store_true", help="Проверить зависимости")
-    parser.add_argument("--check-token", action="store_true", help="Проверить токен Telegram бота")
-    parser.add_argument("--check-db", action="store_true", help="Проверить подключение к базе данных")
-    parser.add_argument("--check-lm-studio", action="store_true", help="Проверить подключение к LM Studio")
-    parser.add_argument("--check-rag", action="store_true", help="Проверить функциональность RAG")
-    parser.add_argument("--init-knowledge", action="store_true", help="Инициализировать базу знаний")
-    parser.add_argument("--init-agents", action="store_true", help="Инициализировать интеграцию агентов")
+    for flag, help_text in _CLI_FLAGS:
+        parser.add_argument(flag, action="store_true", help=help_text)
     
-    args = parser.parse_args()
+    return parser.parse_args(argv)
+
+def main():
+    """Основная функция для запуска скрипта."""
+    args = parse_args(sys.argv[1:])
     
-    # Если не указаны аргументы, по умолчанию запускаем все проверки
-    if not any(vars(args).values()):
+    # Если не указаны проверки, по умолчанию запускаем все проверки
+    if not any(value for name, value in vars(args).items() if name != "strict"):
         args.check_all = True
     
     # Запускаем проверки
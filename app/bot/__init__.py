@@ -6,5 +6,13 @@
 - keyboards.py: Функции для создания клавиатур и меню
 - stickers.py: Функции для работы со стикерами
 """
+import importlib
 
-# Простой модуль-заглушка без импортов, чтобы избежать циклических зависимостей
+# Подмодули загружаются при первом обращении, чтобы избежать циклических зависимостей
+_SUBMODULES = ("handlers", "keyboards", "stickers")
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
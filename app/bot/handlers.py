@@ -2,49 +2,80 @@
 Модуль для обработчиков Telegram бота.
 Исправленная версия с безопасным импортом LM Studio.
 """
+import io
 import logging
-import json
 import asyncio
-from typing import Dict, Any, List, Optional, Tuple, Union
+import time
+import weakref
+from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    TypeHandler,
     ContextTypes,
     filters
 )
 
-from app.config import TELEGRAM_TOKEN, START_COMMANDS, MIN_SUCCESS_PERCENTAGE, FALLBACK_TO_SIMPLE_ANSWERS
-from app.database.models import get_db, init_db
+from app.config import TELEGRAM_TOKEN, START_COMMANDS, MIN_SUCCESS_PERCENTAGE, CONCURRENT_UPDATES
+from app.database.models import init_db, session_scope
+from app.database.pool import run_db, init_pool, close_pool, with_db
+from app.database.cache import (
+    cached_get_all_courses,
+    cached_get_course,
+    cached_get_lesson,
+    cached_get_course_lessons_with_progress,
+    cached_get_question,
+    cached_user_id,
+    prefetch_questions,
+    remember_questions,
+    invalidate_cache
+)
 from app.database.operations import (
-    get_or_create_user,
-    update_user_activity,
-    get_all_courses,
-    get_course,
-    get_lessons_by_course,
-    get_lesson,
-    get_lesson_by_id,
-    get_next_lesson,
-    get_available_lessons,
-    get_user_progress,
-    get_or_create_user_progress,
-    update_user_progress,
-    calculate_lesson_success_percentage,
+    touch_users,
+    record_test_result,
     get_questions_by_lesson,
-    get_question_by_id
+    save_user_answer
 )
 from app.bot.keyboards import (
     get_main_menu_keyboard,
     get_courses_keyboard,
-    get_lessons_keyboard,
-    get_question_options_keyboard,
-    get_continue_keyboard,
-    get_available_lessons_keyboard,
+    get_answer_keyboard,
+    get_test_results_keyboard,
     get_progress_bar,
-    get_start_test_keyboard
+    escape_md,
+    ANSWER_LETTERS,
+    DIFFICULTY_ICONS,
+    get_lesson_actions_keyboard,
+    get_next_question_keyboard,
+    get_back_to_menu_keyboard,
+    get_back_to_courses_keyboard,
+    get_back_to_lesson_keyboard,
+    parse_callback_id,
+    parse_callback_answer,
+    CB_MAIN_MENU,
+    CB_COURSES,
+    CB_PROGRESS,
+    CB_NEXT_QUESTION,
+    CB_COURSE,
+    CB_COURSE_INFO,
+    CB_LESSON,
+    CB_START_TEST,
+    CB_ASK_QUESTION,
+    CB_NEXT_IN_LESSON,
+    CB_RETRY_QUESTION,
+    CB_LESSON_LOCKED,
+    MENU_LEARN,
+    MENU_PROGRESS,
+    MENU_INSTRUCTIONS,
+    INSTRUCTIONS_TEXT
 )
 from app.bot.stickers import (
     send_welcome_sticker,
@@ -61,15 +92,58 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Безопасное создание клиента LM Studio
+# Клиент LM Studio создается при первом вопросе пользователя, а не при импорте модуля
 lm_client = None
-try:
-    from app.utils.lm_studio_client import create_lm_studio_client
-    lm_client = create_lm_studio_client()
-    logger.info(f"LM Studio клиент создан: {lm_client.get_status()}")
-except Exception as e:
-    logger.warning(f"LM Studio клиент недоступен: {e}")
-    lm_client = None
+_lm_client_initialized = False
+
+def get_lm_client():
+    """Возвращает клиент LM Studio, безопасно создавая его при первом обращении."""
+    global lm_client, _lm_client_initialized
+    if not _lm_client_initialized:
+        _lm_client_initialized = True
+        try:
+            from app.utils.lm_studio_client import create_lm_studio_client
+            lm_client = create_lm_studio_client()
+            logger.info(f"LM Studio клиент создан: {lm_client.get_status()}")
+        except Exception as e:
+            logger.warning(f"LM Studio клиент недоступен: {e}")
+            lm_client = None
+    return lm_client
+
+# Команды запуска в нормализованном виде (для проверки за O(1))
+_START_COMMANDS_LC = frozenset(cmd.casefold() for cmd in START_COMMANDS)
+
+# Тексты сообщений
+WELCOME_TEMPLATE = (
+    "👋 Привет, {name}!\n\n"
+    "Я бот для обучения рискам нарушения непрерывности деятельности.\n\n"
+    "Здесь ты сможешь изучить:\n"
+    "📌 Основные понятия рисков нарушения непрерывности\n"
+    "📌 Методы оценки критичности процессов\n"
+    "📌 Подходы к оценке и минимизации рисков\n\n"
+    "Выбери пункт меню, чтобы начать:"
+)
+
+def _course_topic(course) -> str:
+    """Возвращает тему базы знаний для генерации вопросов по курсу."""
+    return course.name.lower().replace(" ", "_") if course else "risk_management"
+
+def _init_course_materials(course) -> Dict[int, Tuple[str, ...]]:
+    """Создает уроки темы и вопросы к ним (в отдельной сессии БД); возвращает части содержимого уроков."""
+    from app.learning.lessons import init_lessons
+    from app.learning.questions import generate_questions_for_lesson
+    topic = _course_topic(course)
+    # Все обращения к БД в этом потоке идут через одну сессию, которая закрывается по завершении
+    lesson_chunks = {}
+    with session_scope():
+        for lesson in init_lessons(course.id):
+            # Содержимое урока статично - разбиваем его на сообщения сразу при загрузке
+            lesson_chunks[lesson.id] = _split_lesson_content(lesson.content)
+            try:
+                _remember_question_ids(lesson.id, generate_questions_for_lesson(lesson.id, topic))
+            except Exception as e:
+                logger.warning(f"Не удалось подготовить вопросы для урока {lesson.id}: {e}")
+    return lesson_chunks
 
 def init_data():
     """Инициализирует базу данных и данные."""
@@ -79,18 +153,28 @@ def init_data():
         
         # Инициализируем темы
         from app.learning.courses import init_courses
-        courses = init_courses()
+        with session_scope():
+            courses = init_courses()
+        
+        # Инициализируем уроки для каждой темы и заранее готовим вопросы к ним,
+        # чтобы запуск теста только читал готовые вопросы из базы
+        # (темы независимы, поэтому обрабатываются параллельно)
+        course_chunks = []
+        if courses:
+            with ThreadPoolExecutor(max_workers=min(8, len(courses)), thread_name_prefix="init") as executor:
+                course_chunks = list(executor.map(_init_course_materials, courses))
         
-        # Инициализируем уроки для каждой темы
-        from app.learning.lessons import init_lessons
-        for course in courses:
-            init_lessons(course.id)
+        # Учебные материалы могли измениться - сбрасываем кэш
+        # (ID вопросов и части уроков, подготовленные выше, остаются актуальными)
+        invalidate_cache()
+        _lesson_chunks_cache.clear()
+        for lesson_chunks in course_chunks:
+            _lesson_chunks_cache.update(lesson_chunks)
+        _prewarmed_lessons.clear()
             
         logger.info("База данных и учебные материалы успешно инициализированы")
     except Exception as e:
-        logger.error(f"Ошибка при инициализации данных: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception(f"Ошибка при инициализации данных: {e}")
 
 def get_fallback_answer(question: str) -> str:
     """Возвращает базовый ответ при недоступности LM Studio."""
@@ -134,61 +218,48 @@ def get_fallback_answer(question: str) -> str:
 
 Если у вас есть более конкретный вопрос, попробуйте переформулировать его."""
 
+async def _send_welcome_sticker_background(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
+    """Фоновая задача: отправляет приветственный стикер."""
+    try:
+        await send_welcome_sticker(context, chat_id)
+    except Exception as e:
+        logger.warning(f"Не удалось отправить стикер: {e}")
+
+@with_db
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает команду /start."""
     chat_id = update.effective_chat.id
     user = update.effective_user
     
-    # Создаем пользователя в базе данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    update_user_activity(db, db_user.id)
+    # Серия одинаковых /start подряд обрабатывается один раз
+    if _is_duplicate_callback(chat_id, "/start"):
+        return
     
-    # Отправляем приветственный стикер
-    try:
-        await send_welcome_sticker(context, chat_id)
-    except Exception as e:
-        logger.warning(f"Не удалось отправить стикер: {e}")
+    # Создаем пользователя в базе данных (известные пользователи берутся из кэша)
+    await cached_user_id(user)
     
-    # Отправляем приветственное сообщение
-    welcome_message = (
-        f"👋 Привет, {user.first_name}!\n\n"
-        "Я бот для обучения рискам нарушения непрерывности деятельности.\n\n"
-        "Здесь ты сможешь изучить:\n"
-        "📌 Основные понятия рисков нарушения непрерывности\n"
-        "📌 Методы оценки критичности процессов\n"
-        "📌 Подходы к оценке и минимизации рисков\n\n"
-        "Выбери пункт меню, чтобы начать:"
-    )
+    # Стикер отправляется в фоне, не задерживая приветственное сообщение
+    context.application.create_task(_send_welcome_sticker_background(context, chat_id))
     
+    # Отправляем приветственное сообщение
     await context.bot.send_message(
         chat_id=chat_id,
-        text=welcome_message,
+        text=WELCOME_TEMPLATE.format(name=user.first_name),
         reply_markup=get_main_menu_keyboard()
     )
 
+@with_db
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает текстовые сообщения."""
+    # Сообщения и нажатия кнопок одного чата обрабатываются по очереди (общие user_data),
+    # разные чаты - параллельно
+    async with _get_chat_lock(update.effective_chat.id):
+        await _process_message(update, context)
+
+async def _process_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Выполняет действие, соответствующее текстовому сообщению."""
     chat_id = update.effective_chat.id
-    user = update.effective_user
-    message_text = update.message.text.lower()
-    
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    update_user_activity(db, db_user.id)
+    message_text = update.message.text.strip().casefold()
     
     # Проверяем, ожидаем ли вопрос от пользователя
     if context.user_data.get('waiting_for_question', False):
@@ -196,60 +267,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
     
     # Обработка команд запуска
-    if message_text in [cmd.lower() for cmd in START_COMMANDS]:
+    if message_text in _START_COMMANDS_LC:
         await start(update, context)
         return
     
     # Обработка выбора пункта меню
-    if message_text == "📚 обучение":
-        courses = get_all_courses(db)
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text="Выберите тему для изучения:",
-            reply_markup=get_courses_keyboard(courses)
-        )
-    
-    elif message_text == "📊 мой прогресс":
-        from app.bot.handlers_menu import show_progress
-        await show_progress(update, context)
-    
-    elif message_text == "ℹ️ инструкция":
-        instructions = (
-            "📋 **Инструкция по работе с ботом**\n\n"
-            "1️⃣ **Структура обучения**:\n"
-            "   • Обучение разделено на темы\n"
-            "   • Каждая тема содержит несколько уроков\n"
-            "   • После каждого урока вы ответите на вопросы\n\n"
-            
-            "2️⃣ **Прохождение уроков**:\n"
-            "   • Уроки открываются последовательно\n"
-            "   • Для перехода к следующему уроку необходимо правильно ответить на 80% вопросов\n"
-            "   • Урок можно проходить повторно\n\n"
-            
-            "3️⃣ **Ответы на вопросы**:\n"
-            "   • После каждого урока вам будет предложено ответить на 3 вопроса\n"
-            "   • Выбирайте один из предложенных вариантов ответа\n"
-            "   • После ответа вы получите объяснение\n"
-            "   • При неправильном ответе вы получите дополнительные пояснения\n\n"
-            
-            "4️⃣ **Интерактивные возможности**:\n"
-            "   • Вы можете задавать вопросы по материалу урока\n"
-            "   • Система адаптируется к вашему уровню знаний\n"
-            "   • Сложность и объяснения подстраиваются под ваши потребности\n\n"
-            
-            "5️⃣ **Прогресс обучения**:\n"
-            "   • В разделе 'Мой прогресс' вы можете увидеть пройденные и доступные уроки\n"
-            "   • Прогресс обучения сохраняется между сессиями\n\n"
-            
-            "Желаем успешного обучения! 🚀"
-        )
-        
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=instructions,
-            parse_mode="Markdown"
-        )
-    
+    action = _MENU_ACTIONS.get(message_text)
+    if action:
+        await action(update, context)
     else:
         # Если не распознали команду, предлагаем варианты
         await context.bot.send_message(
@@ -258,6 +283,44 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             reply_markup=get_main_menu_keyboard()
         )
 
+async def _menu_courses(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Пункт меню «Обучение»: список тем."""
+    courses = await cached_get_all_courses()
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text="Выберите тему для изучения:",
+        reply_markup=get_courses_keyboard(courses)
+    )
+
+async def _menu_progress(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Пункт меню «Мой прогресс»."""
+    from app.bot.handlers_menu import show_progress
+    await show_progress(update, context)
+
+async def _menu_instructions(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Пункт меню «Инструкция»."""
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=INSTRUCTIONS_TEXT,
+        parse_mode="Markdown"
+    )
+
+# Пункты главного меню (нормализованный текст -> обработчик)
+_MENU_ACTIONS = {
+    MENU_LEARN.casefold(): _menu_courses,
+    MENU_PROGRESS.casefold(): _menu_progress,
+    MENU_INSTRUCTIONS.casefold(): _menu_instructions,
+}
+
+def _generate_answer(user_question: str, lesson_context: str) -> str:
+    """Готовит ответ на вопрос пользователя (блокирующий вызов LM Studio или запасной ответ)."""
+    client = get_lm_client()
+    if client and client.is_available:
+        # Используем LM Studio для ответа
+        return client.answer_question(user_question, lesson_context)
+    # Используем fallback ответ
+    return get_fallback_answer(user_question)
+
 async def process_user_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает вопрос пользователя с использованием LM Studio."""
     user_question = update.message.text
@@ -268,8 +331,7 @@ async def process_user_question(update: Update, context: ContextTypes.DEFAULT_TY
     lesson_title = "урок"
     
     if lesson_id:
-        db = get_db()
-        lesson = get_lesson_by_id(db, lesson_id)
+        lesson = await cached_get_lesson(lesson_id)
         if lesson:
             lesson_context = lesson.content
             lesson_title = lesson.title
@@ -277,14 +339,9 @@ async def process_user_question(update: Update, context: ContextTypes.DEFAULT_TY
     # Отправляем индикатор "печатает"
     await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
     
-    # Генерируем ответ
+    # Генерируем ответ (HTTP-запросы к LM Studio с паузами между попытками - вне цикла событий)
     try:
-        if lm_client and lm_client.is_available:
-            # Используем LM Studio для ответа
-            ai_response = lm_client.answer_question(user_question, lesson_context)
-        else:
-            # Используем fallback ответ
-            ai_response = get_fallback_answer(user_question)
+        ai_response = await asyncio.to_thread(_generate_answer, user_question, lesson_context)
         
         # Формируем сообщение с ответом
         response_text = f"❓ **Ваш вопрос:** {user_question}\n\n"
@@ -293,9 +350,9 @@ async def process_user_question(update: Update, context: ContextTypes.DEFAULT_TY
         
         # Создаем клавиатуру для дальнейших действий
         keyboard = [
-            [InlineKeyboardButton("❓ Задать еще вопрос", callback_data=f"ask_question_{lesson_id}")],
-            [InlineKeyboardButton("📝 Начать тест", callback_data=f"start_test_{lesson_id}")],
-            [InlineKeyboardButton("🔙 К уроку", callback_data=f"lesson_{lesson_id}")]
+            [InlineKeyboardButton("❓ Задать еще вопрос", callback_data=f"{CB_ASK_QUESTION}{lesson_id}")],
+            [InlineKeyboardButton("📝 Начать тест", callback_data=f"{CB_START_TEST}{lesson_id}")],
+            [InlineKeyboardButton("🔙 К уроку", callback_data=f"{CB_LESSON}{lesson_id}")]
         ]
         
         await update.message.reply_text(
@@ -315,6 +372,81 @@ async def process_user_question(update: Update, context: ContextTypes.DEFAULT_TY
     context.user_data['waiting_for_question'] = False
     context.user_data.pop('question_lesson_id', None)
 
+# Период (секунды) пакетной записи активности пользователей в БД
+ACTIVITY_FLUSH_INTERVAL = 5
+# Размер буфера, при котором активность записывается, не дожидаясь периода
+ACTIVITY_FLUSH_MAX_PENDING = 1000
+ACTIVITY_FLUSH_JOB = "flush_user_activity"
+
+# telegram_id -> (username, first_name, last_name, время активности) с момента последней записи
+_pending_activity: Dict[int, Tuple[Optional[str], Optional[str], Optional[str], datetime]] = {}
+_activity_job_scheduled = False
+
+def _schedule_activity_flush(job_queue) -> None:
+    """Ставит периодическую запись активности в очередь задач (один раз)."""
+    global _activity_job_scheduled
+    if not job_queue.get_jobs_by_name(ACTIVITY_FLUSH_JOB):
+        job_queue.run_repeating(
+            _flush_activity,
+            interval=ACTIVITY_FLUSH_INTERVAL,
+            first=ACTIVITY_FLUSH_INTERVAL,
+            name=ACTIVITY_FLUSH_JOB
+        )
+    _activity_job_scheduled = True
+
+def _mark_activity(context: ContextTypes.DEFAULT_TYPE, user) -> None:
+    """Запоминает активность пользователя для последующей пакетной записи."""
+    _pending_activity[user.id] = (user.username, user.first_name, user.last_name, datetime.utcnow())
+    job_queue = context.job_queue
+    if job_queue is None or len(_pending_activity) >= ACTIVITY_FLUSH_MAX_PENDING:
+        # Без очереди задач (или при переполнении буфера) записываем сразу,
+        # но не задерживая ответ пользователю
+        context.application.create_task(_flush_activity())
+    elif not _activity_job_scheduled:
+        # Приложение создано без _post_init - периодическая запись ставится при первом обновлении
+        _schedule_activity_flush(job_queue)
+
+async def _track_activity(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Промежуточный обработчик (группа -1): отмечает активность пользователя для любого обновления."""
+    if update.effective_user:
+        _mark_activity(context, update.effective_user)
+
+async def _flush_activity(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> None:
+    """Записывает накопленную активность пользователей одним пакетом."""
+    if not _pending_activity:
+        return
+    batch = _pending_activity.copy()
+    _pending_activity.clear()
+    await run_db(touch_users, batch)
+
+# Окно (секунды), в котором повторное нажатие той же кнопки считается двойным тапом
+CALLBACK_DEDUP_WINDOW = 0.25
+_RECENT_CALLBACKS_MAX = 10000
+
+# (chat_id, callback_data) -> время последнего нажатия
+_recent_callbacks: "OrderedDict[Tuple[int, str], float]" = OrderedDict()
+
+# Блокировки чатов: сообщения и нажатия кнопок одного чата выполняются по очереди
+_chat_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def _is_duplicate_callback(chat_id: int, data: str) -> bool:
+    """Проверяет, было ли такое же нажатие в этом чате только что."""
+    now = time.monotonic()
+    key = (chat_id, data)
+    last_seen = _recent_callbacks.pop(key, None)
+    _recent_callbacks[key] = now
+    if len(_recent_callbacks) > _RECENT_CALLBACKS_MAX:
+        _recent_callbacks.popitem(last=False)
+    return last_seen is not None and now - last_seen < CALLBACK_DEDUP_WINDOW
+
+def _get_chat_lock(chat_id: int) -> asyncio.Lock:
+    """Возвращает блокировку чата (существует, пока ее кто-то удерживает)."""
+    lock = _chat_locks.get(chat_id)
+    if lock is None:
+        lock = _chat_locks[chat_id] = asyncio.Lock()
+    return lock
+
+@with_db
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает нажатия на inline кнопки."""
     query = update.callback_query
@@ -323,64 +455,61 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # ОТЛАДКА: Логируем все callback данные
     logger.info(f"Получен callback: {query.data} от пользователя {user.id}")
     
+    chat_id = query.message.chat_id if query.message else user.id
+    
+    # Двойной тап: только подтверждаем нажатие, не выполняя действие повторно
+    if _is_duplicate_callback(chat_id, query.data):
+        logger.info(f"Повторное нажатие {query.data} в чате {chat_id} пропущено")
+        try:
+            await query.answer()
+        except Exception as e:
+            logger.warning(f"Не удалось подтвердить callback: {e}")
+        return
+    
+    # Следующее нажатие в том же чате ждет завершения текущего
+    async with _get_chat_lock(chat_id):
+        await _process_callback(update, context)
+
+# Подсказка при нажатии на заблокированный урок
+_LESSON_LOCKED_TEXT = "🔒 Этот урок пока заблокирован. Пройдите предыдущие уроки темы."
+
+async def _process_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Выполняет действие, соответствующее нажатой кнопке."""
+    query = update.callback_query
+    
     try:
+        data = query.data
+        if data == CB_LESSON_LOCKED:
+            # Заблокированный урок: только всплывающая подсказка, сообщение не меняется
+            await query.answer(_LESSON_LOCKED_TEXT, show_alert=True)
+            return
+        
         # Отвечаем на callback query
         await query.answer()
         
-        # Парсим callback data
-        if query.data == "main_menu" or query.data == "back_to_main":
-            await show_main_menu(update, context)
-        elif query.data == "courses":
-            await show_courses(update, context)
-        elif query.data.startswith("course_"):
-            course_id = int(query.data.replace("course_", ""))
-            await show_course_lessons(update, context, course_id)
-        elif query.data.startswith("lesson_"):
-            lesson_id = int(query.data.replace("lesson_", ""))
-            logger.info(f"Попытка открыть урок {lesson_id}")
-            await show_lesson_content(update, context, lesson_id)
-                
-        elif query.data.startswith("start_test_"):
-            lesson_id = int(query.data.replace("start_test_", ""))
-            logger.info(f"Попытка запустить тест для урока {lesson_id}")
-            await start_lesson_test(update, context, lesson_id)
-                
-        elif query.data.startswith("ask_question_"):
-            lesson_id = int(query.data.replace("ask_question_", ""))
-            logger.info(f"Попытка задать вопрос по уроку {lesson_id}")
-            await handle_user_question(update, context, lesson_id)
-                
-        elif query.data.startswith("answer_"):
-            # Парсим данные ответа: answer_questionId_letter
-            parts = query.data.split("_")
-            if len(parts) >= 3:
-                question_id = int(parts[1])
-                answer_letter = parts[2]
-                logger.info(f"Ответ на вопрос {question_id}: {answer_letter}")
-                await handle_answer_selection(update, context, question_id, answer_letter)
-            else:
-                logger.error(f"Неверный формат данных ответа: {query.data}")
-                
-        elif query.data == "next_question":
-            logger.info("Переход к следующему вопросу")
-            await handle_next_question(update, context)
-            
-        elif query.data.startswith("next_question_"):
-            lesson_id = int(query.data.replace("next_question_", ""))
-            await handle_next_question_in_lesson(update, context, lesson_id)
-            
-        elif query.data.startswith("retry_question_"):
-            question_id = int(query.data.replace("retry_question_", ""))
-            await retry_question(update, context, question_id)
-            
+        # Разбираем callback data по порядку и останавливаемся на первом совпадении:
+        # точные совпадения, затем действие+ID, затем ответ на вопрос
+        handler = _EXACT_CALLBACKS.get(data)
+        if handler:
+            await handler(update, context)
+            return
+        
+        action, item_id = parse_callback_id(data)
+        id_handler = _ID_CALLBACKS.get(action)
+        if id_handler:
+            await id_handler(update, context, item_id)
+            return
+        
+        answer_question_id, answer_letter = parse_callback_answer(data)
+        if answer_question_id is not None:
+            logger.info(f"Ответ на вопрос {answer_question_id}: {answer_letter}")
+            await handle_answer_selection(update, context, answer_question_id, answer_letter)
         else:
             logger.warning(f"Неизвестный callback: {query.data}")
             await query.message.edit_text("❌ Неизвестная команда")
             
     except Exception as e:
-        logger.error(f"Ошибка при обработке callback: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception(f"Ошибка при обработке callback: {e}")
         try:
             await query.message.reply_text("Произошла ошибка. Пожалуйста, попробуйте еще раз.")
         except:
@@ -407,8 +536,7 @@ async def show_courses(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     """Показывает список курсов."""
     query = update.callback_query
     
-    db = get_db()
-    courses = get_all_courses(db)
+    courses = await cached_get_all_courses()
     
     await query.message.edit_text(
         "📚 **Выберите тему для изучения:**",
@@ -421,32 +549,26 @@ async def show_course_lessons(update: Update, context: ContextTypes.DEFAULT_TYPE
     query = update.callback_query
     user = query.from_user
     
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
+    # Независимые запросы выполняем параллельно
+    user_id, course = await asyncio.gather(
+        cached_user_id(user),
+        cached_get_course(course_id)
     )
     
-    course = get_course(db, course_id)
-    lessons = get_lessons_by_course(db, course_id)
+    # Уроки темы и прогресс по ним - одним запросом (уроки берутся из кэша, если они там есть)
+    lessons, progress_map = await cached_get_course_lessons_with_progress(course_id, user_id)
     
     if not lessons:
         await query.message.edit_text(
             "❌ Уроки для этой темы пока не созданы.",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🔙 К темам", callback_data="courses")]
-            ])
+            reply_markup=get_back_to_courses_keyboard()
         )
         return
     
     # Создаем клавиатуру с уроками
     keyboard = []
     for lesson in lessons:
-        # Проверяем прогресс по уроку
-        progress = get_user_progress(db, db_user.id, lesson.id)
+        progress = progress_map.get(lesson.id)
         
         if progress and progress.is_completed:
             status = "✅"
@@ -456,13 +578,13 @@ async def show_course_lessons(update: Update, context: ContextTypes.DEFAULT_TYPE
         keyboard.append([
             InlineKeyboardButton(
                 f"{status} {lesson.title}",
-                callback_data=f"lesson_{lesson.id}"
+                callback_data=f"{CB_LESSON}{lesson.id}"
             )
         ])
     
-    keyboard.append([InlineKeyboardButton("🔙 К темам", callback_data="courses")])
+    keyboard.append([InlineKeyboardButton("🔙 К темам", callback_data=CB_COURSES)])
     
-    message_text = f"📖 **{course.name}**\n\n{course.description}\n\n**Уроки:**"
+    message_text = f"📖 **{escape_md(course.name)}**\n\n{escape_md(course.description)}\n\n**Уроки:**"
     
     await query.message.edit_text(
         message_text,
@@ -470,76 +592,151 @@ async def show_course_lessons(update: Update, context: ContextTypes.DEFAULT_TYPE
         reply_markup=InlineKeyboardMarkup(keyboard)
     )
 
+# Максимальная длина части урока в одном сообщении (с запасом под заголовок
+# части до лимита Telegram в 4096 символов)
+LESSON_CHUNK_LENGTH = 3800
+
+# Содержимое уроков, уже разбитое на части: lesson_id -> части (заполняется в init_data)
+_lesson_chunks_cache: Dict[int, Tuple[str, ...]] = {}
+
+# Уроки, для которых уже запланирована фоновая подготовка вопросов
+_prewarmed_lessons: set = set()
+
+# Готовые вопросы уроков: lesson_id -> ID вопросов (заполняется в init_data).
+# Кортежи неизменяемы, поэтому тесты всех пользователей ссылаются на один и тот же объект
+_question_ids_cache: Dict[int, Tuple[int, ...]] = {}
+
+def _remember_question_ids(lesson_id: int, questions) -> Tuple[int, ...]:
+    """Запоминает ID вопросов урока (объекты вопросов или готовые ID), если они уже созданы."""
+    question_ids = tuple(q if isinstance(q, int) else q.id for q in questions or ())
+    if question_ids:
+        _question_ids_cache[lesson_id] = question_ids
+    return question_ids
+
+def _generate_question_ids(lesson_id: int, topic: str) -> List[int]:
+    """Генерирует вопросы урока в собственной сессии БД (для пула потоков) и возвращает их ID."""
+    from app.learning.questions import generate_questions_for_lesson
+    with session_scope():
+        return [q.id for q in generate_questions_for_lesson(lesson_id, topic)]
+
+async def _get_question_ids(lesson_id: int) -> Tuple[int, ...]:
+    """Возвращает ID вопросов урока из кэша или из базы данных."""
+    question_ids = _question_ids_cache.get(lesson_id)
+    if question_ids is None:
+        questions = await run_db(get_questions_by_lesson, lesson_id)
+        remember_questions(questions)
+        question_ids = _remember_question_ids(lesson_id, questions)
+    return question_ids
+
+def _split_lesson_content(content: str) -> Tuple[str, ...]:
+    """Разбивает содержимое урока на части не длиннее LESSON_CHUNK_LENGTH."""
+    return tuple(content[i:i + LESSON_CHUNK_LENGTH] for i in range(0, len(content), LESSON_CHUNK_LENGTH)) or (content,)
+
+def _get_lesson_chunks(lesson) -> Tuple[str, ...]:
+    """Возвращает содержимое урока, разбитое на части (вычисляется один раз на урок)."""
+    chunks = _lesson_chunks_cache.get(lesson.id)
+    if chunks is None:
+        chunks = _lesson_chunks_cache[lesson.id] = _split_lesson_content(lesson.content)
+    return chunks
+
+async def _delete_message_quietly(message) -> None:
+    """Удаляет сообщение, игнорируя ошибки (например, если оно уже удалено)."""
+    try:
+        await message.delete()
+    except Exception:
+        pass
+
+async def _send_lesson_body(context: ContextTypes.DEFAULT_TYPE, chat_id: int, lesson) -> None:
+    """Отправляет содержимое урока (одним сообщением, документом или частями)."""
+    # Разбиваем содержимое на части, если оно слишком длинное
+    chunks = _get_lesson_chunks(lesson)
+    
+    if len(chunks) == 1:
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=f"📝 **{escape_md(lesson.title)}**\n\n{chunks[0]}",
+            parse_mode="Markdown"
+        )
+    else:
+        # Длинный урок отправляем одним документом вместо нескольких сообщений
+        try:
+            await context.bot.send_document(
+                chat_id=chat_id,
+                document=io.BytesIO(lesson.content.encode("utf-8")),
+                filename=f"{lesson.title}.md",
+                caption=f"📝 **{escape_md(lesson.title)}**",
+                parse_mode="Markdown"
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось отправить урок {lesson.id} документом: {e}")
+            
+            # Отправляем содержимое частями одновременно: порядок доставки не гарантирован,
+            # поэтому каждая часть несет заголовок урока и свой номер
+            title = escape_md(lesson.title)
+            total = len(chunks)
+            await asyncio.gather(*(
+                context.bot.send_message(
+                    chat_id=chat_id,
+                    text=f"📝 **{title}** (часть {number}/{total})\n\n{chunk}",
+                    parse_mode="Markdown"
+                )
+                for number, chunk in enumerate(chunks, 1)
+            ))
+
 async def show_lesson_content(update: Update, context: ContextTypes.DEFAULT_TYPE, lesson_id: int) -> None:
     """Показывает содержимое урока с кнопками действий."""
     query = update.callback_query
-    user = query.from_user
-    
-    # Получаем пользователя и урок из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
     
-    lesson = get_lesson(db, lesson_id)
+    lesson = await cached_get_lesson(lesson_id)
     
     if not lesson:
         await query.message.edit_text(
             "❌ Урок не найден.",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🏠 Главное меню", callback_data="back_to_main")]
-            ])
+            reply_markup=get_back_to_menu_keyboard()
         )
         return
     
-    # Удаляем предыдущее сообщение и отправляем новое с содержимым урока
-    try:
-        await query.message.delete()
-    except:
-        pass
-    
-    # Разбиваем содержимое на части, если оно слишком длинное
-    content = lesson.content
-    max_length = 4000
-    
-    if len(content) <= max_length:
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text=f"📝 **{lesson.title}**\n\n{content}",
-            parse_mode="Markdown"
-        )
-    else:
-        # Отправляем заголовок
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text=f"📝 **{lesson.title}**",
-            parse_mode="Markdown"
-        )
-        
-        # Отправляем содержимое частями
-        chunks = [content[i:i+max_length] for i in range(0, len(content), max_length)]
-        for chunk in chunks:
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text=chunk,
-                parse_mode="Markdown"
-            )
+    # Удаление предыдущего сообщения и отправка урока не зависят друг от друга - выполняем параллельно
+    await asyncio.gather(
+        _delete_message_quietly(query.message),
+        _send_lesson_body(context, query.message.chat_id, lesson)
+    )
     
     # Отправляем предложение пройти тест
     await context.bot.send_message(
         chat_id=query.message.chat_id,
         text="Теперь давайте проверим ваши знания. Готовы ответить на несколько вопросов?",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("✅ Начать тест", callback_data=f"start_test_{lesson_id}")],
-            [InlineKeyboardButton("❓ Задать вопрос по уроку", callback_data=f"ask_question_{lesson_id}")],
-            [InlineKeyboardButton("📋 К урокам", callback_data=f"course_{lesson.course_id}")]
-        ])
+        reply_markup=get_lesson_actions_keyboard(lesson_id, lesson.course_id)
+    )
+    
+    # Пока пользователь читает урок, готовим вопросы к тесту в фоне
+    _schedule_questions_prewarm(context, lesson)
+
+def _schedule_questions_prewarm(context: ContextTypes.DEFAULT_TYPE, lesson) -> None:
+    """Планирует фоновую подготовку вопросов урока (один раз на урок)."""
+    job_queue = context.job_queue
+    if job_queue is None or lesson.id in _prewarmed_lessons:
+        return
+    _prewarmed_lessons.add(lesson.id)
+    job_queue.run_once(
+        _prewarm_questions,
+        when=0.5,
+        data=(lesson.id, lesson.course_id),
+        name=f"prewarm_questions_{lesson.id}"
     )
 
+async def _prewarm_questions(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Фоновая задача: создает вопросы урока, если их еще нет в базе."""
+    lesson_id, course_id = context.job.data
+    try:
+        course = await cached_get_course(course_id)
+        loop = asyncio.get_running_loop()
+        question_ids = await loop.run_in_executor(init_pool(), _generate_question_ids, lesson_id, _course_topic(course))
+        _remember_question_ids(lesson_id, question_ids)
+    except Exception as e:
+        _prewarmed_lessons.discard(lesson_id)
+        logger.warning(f"Не удалось заранее подготовить вопросы для урока {lesson_id}: {e}")
+
 async def handle_user_question(update: Update, context: ContextTypes.DEFAULT_TYPE, lesson_id: int) -> None:
     """Обрабатывает запрос пользователя задать вопрос по уроку."""
     query = update.callback_query
@@ -557,74 +754,71 @@ async def handle_user_question(update: Update, context: ContextTypes.DEFAULT_TYP
         "• Какие факторы влияют на риск нарушения непрерывности?\n\n"
         "Напишите ваш вопрос:",
         parse_mode="Markdown",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("❌ Отмена", callback_data=f"lesson_{lesson_id}")]
-        ])
+        reply_markup=get_back_to_lesson_keyboard(lesson_id, "❌ Отмена")
     )
 
 async def start_lesson_test(update: Update, context: ContextTypes.DEFAULT_TYPE, lesson_id: int) -> None:
     """Запускает тест по уроку."""
     query = update.callback_query
-    user = query.from_user
     
-    # Получаем пользователя и урок из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
+    # Урок и ID вопросов берем из кэша (при промахе - из базы данных параллельно)
+    lesson, question_ids = await asyncio.gather(
+        cached_get_lesson(lesson_id),
+        _get_question_ids(lesson_id)
     )
-    
-    lesson = get_lesson(db, lesson_id)
     if not lesson:
         await query.message.edit_text("❌ Урок не найден.")
         return
     
-    # Получаем или создаем вопросы для урока
-    questions = get_questions_by_lesson(db, lesson_id)
-    
-    if not questions:
-        # Создаем вопросы, если их нет
+    if not question_ids:
+        # Вопросы готовятся в init_data; здесь - запасной вариант для новых уроков
         try:
-            from app.learning.questions import generate_questions_for_lesson
-            course = get_course(db, lesson.course_id)
-            topic = course.name.lower().replace(" ", "_") if course else "risk_management"
-            questions = generate_questions_for_lesson(lesson_id, topic)
+            course = await cached_get_course(lesson.course_id)
+            # Генерация работает с БД и базой знаний синхронно - выполняем ее вне цикла событий
+            loop = asyncio.get_running_loop()
+            question_ids = await loop.run_in_executor(init_pool(), _generate_question_ids, lesson_id, _course_topic(course))
+            question_ids = _remember_question_ids(lesson_id, question_ids)
         except Exception as e:
             logger.error(f"Ошибка при генерации вопросов: {e}")
-            questions = []
+            question_ids = ()
     
-    if not questions:
+    if not question_ids:
         await query.message.edit_text(
             f"❌ К сожалению, для урока '{lesson.title}' пока нет вопросов.\n"
             "Попробуйте другой урок или вернитесь позже.",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🔙 К уроку", callback_data=f"lesson_{lesson_id}")]
-            ])
+            reply_markup=get_back_to_lesson_keyboard(lesson_id)
         )
         return
     
-    # Инициализируем тест в контексте пользователя
+    # Инициализируем тест в контексте пользователя (общий кортеж ID вопросов урока, без копии)
     context.user_data['current_test'] = {
         'lesson_id': lesson_id,
-        'questions': [q.id for q in questions],
+        'questions': question_ids,
         'current_question_index': 0,
         'correct_answers': 0,
-        'total_questions': len(questions)
+        'total_questions': len(question_ids)
     }
     
+    # Все вопросы теста загружаем одним запросом и держим ссылки на них в тесте:
+    # дальше тест идет без обращений к БД, даже если запись кэша устареет
+    context.user_data['current_test']['question_objects'] = await prefetch_questions(question_ids)
+    
     # Показываем первый вопрос
-    await send_question(update, context, questions[0].id)
+    await send_question(update, context, question_ids[0])
+
+async def _get_test_question(context: ContextTypes.DEFAULT_TYPE, question_id: int):
+    """Возвращает вопрос текущего теста (загруженный при старте теста) или из кэша."""
+    question = context.user_data.get('current_test', {}).get('question_objects', {}).get(question_id)
+    if question is None:
+        question = await cached_get_question(question_id)
+    return question
 
 async def send_question(update: Update, context: ContextTypes.DEFAULT_TYPE, question_id: int) -> None:
     """Отправляет вопрос пользователю."""
     query = update.callback_query
     chat_id = query.message.chat_id
     
-    db = get_db()
-    question = get_question_by_id(db, question_id)
+    question = await _get_test_question(context, question_id)
     
     if not question:
         await query.message.edit_text("❌ Вопрос не найден.")
@@ -636,91 +830,82 @@ async def send_question(update: Update, context: ContextTypes.DEFAULT_TYPE, ques
     total_questions = test_data.get('total_questions', 1)
     
     # Парсим варианты ответов
-    if isinstance(question.options, str):
-        try:
-            options = json.loads(question.options)
-        except:
-            options = [opt.strip() for opt in question.options.split('\n') if opt.strip()]
-    else:
-        options = question.options
+    options = question.options_list
     
     # Формируем текст вопроса
     question_number = current_index + 1
     progress_text = f"📊 Вопрос {question_number} из {total_questions}\n\n"
     
     # Добавляем индикатор сложности
-    difficulty_map = {
-        "легкий": "⭐",
-        "средний": "⭐⭐", 
-        "сложный": "⭐⭐⭐"
-    }
     difficulty = getattr(question, 'difficulty', 'средний')
-    difficulty_indicator = difficulty_map.get(difficulty, "⭐⭐")
+    difficulty_indicator = DIFFICULTY_ICONS.get(difficulty, "⭐⭐")
     difficulty_text = f"{difficulty_indicator} **Сложность:** {difficulty}\n\n"
     
     # Форматируем вопрос с вариантами ответов
-    question_text = f"❓ **{question.text}**\n\n"
+    question_text = f"❓ **{escape_md(question.text)}**\n\n"
     
-    letters = ['A', 'B', 'C', 'D', 'E', 'F']
-    for i, option in enumerate(options):
-        if i < len(letters):
-            question_text += f"**{letters[i]}.** {option}\n\n"
+    for letter, option in zip(ANSWER_LETTERS, options):
+        question_text += f"**{letter}.** {escape_md(option)}\n\n"
     
     full_text = f"{progress_text}{difficulty_text}{question_text.rstrip()}"
     
-    # Создаем клавиатуру с вариантами ответов
-    keyboard = []
-    for i in range(min(len(options), len(letters))):
-        button = InlineKeyboardButton(
-            text=f"🔘 {letters[i]}",
-            callback_data=f"answer_{question_id}_{letters[i]}"
-        )
-        keyboard.append([button])
-    
+    # Клавиатура с вариантами ответов (кэшируется по вопросу)
     await query.message.edit_text(
         full_text,
         parse_mode="Markdown",
-        reply_markup=InlineKeyboardMarkup(keyboard)
+        reply_markup=get_answer_keyboard(question_id, min(len(options), len(ANSWER_LETTERS)), "🔘 ")
     )
 
+# Шаблоны сообщений с результатом ответа и теста (разбираются один раз при загрузке модуля)
+_CORRECT_ANSWER_TMPL = (
+    "✅ **Правильно!**\n\n"
+    "**Ответ {letter}:** {option}\n\n"
+    "**Объяснение:** {explanation}"
+)
+_WRONG_ANSWER_TMPL = (
+    "❌ **Неправильно**\n\n"
+    "**Правильный ответ: {letter}.** {option}\n\n"
+    "**Объяснение:** {explanation}"
+)
+_TEST_PASSED_TMPL = (
+    "🎉 **Поздравляем!** Вы успешно прошли урок \"{title}\".\n\n"
+    "**Ваш результат:** {correct} из {total} ({percentage:.1f}%)\n\n"
+    "**Прогресс:** {progress_bar}\n\n"
+    "Вы можете перейти к следующему уроку или вернуться к списку уроков."
+)
+_TEST_FAILED_TMPL = (
+    "📊 **Результаты теста по уроку** \"{title}\":\n\n"
+    "Вы ответили правильно на {correct} из {total} вопросов ({percentage:.1f}%)\n\n"
+    "**Прогресс:** {progress_bar}\n\n"
+    "Для перехода к следующему уроку необходимо набрать не менее {min_percentage}%.\n"
+    "Рекомендуем повторить материал и пройти тест еще раз."
+)
+
 async def handle_answer_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, question_id: int, answer_letter: str) -> None:
     """Обрабатывает выбор варианта ответа пользователем."""
     query = update.callback_query
     user = query.from_user
     chat_id = query.message.chat_id
     
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
+    # Пользователь и вопрос (один запрос вместо отдельных для проверки, объяснения и вывода)
+    user_id, question = await asyncio.gather(
+        cached_user_id(user),
+        _get_test_question(context, question_id)
     )
     
-    # Проверяем ответ
+    if not question:
+        await query.message.edit_text("❌ Вопрос не найден.")
+        return
+    
+    # Проверяем ответ и сохраняем его
+    is_correct = answer_letter == question.correct_answer
+    explanation = question.explanation or "Объяснение недоступно."
     try:
-        from app.learning.questions import check_answer, get_explanation
-        is_correct = check_answer(question_id, db_user.id, answer_letter)
-        explanation = get_explanation(question_id)
+        await run_db(save_user_answer, user_id, question_id, answer_letter, is_correct, question.lesson_id)
     except Exception as e:
-        logger.error(f"Ошибка при проверке ответа: {e}")
-        # Резервная логика проверки ответа
-        question = get_question_by_id(db, question_id)
-        is_correct = question.correct_answer == answer_letter if question else False
-        explanation = question.explanation if question else "Объяснение недоступно."
+        logger.error(f"Ошибка при сохранении ответа пользователя: {e}")
     
-    # Получаем вопрос для отображения правильного ответа
-    question = get_question_by_id(db, question_id)
-    
-    if isinstance(question.options, str):
-        try:
-            options = json.loads(question.options)
-        except:
-            options = [opt.strip() for opt in question.options.split('\n') if opt.strip()]
-    else:
-        options = question.options
+    options = question.options_list
     
     # Обновляем счетчик правильных ответов
     test_data = context.user_data.get('current_test', {})
@@ -741,26 +926,17 @@ async def handle_answer_selection(update: Update, context: ContextTypes.DEFAULT_
         logger.warning(f"Не удалось отправить стикер: {e}")
     
     # Формируем сообщение с результатом
-    if is_correct:
-        result_message = (
-            "✅ **Правильно!**\n\n"
-            f"**Ответ {question.correct_answer}:** {correct_option_text}\n\n"
-            f"**Объяснение:** {explanation}"
-        )
-    else:
-        result_message = (
-            "❌ **Неправильно**\n\n"
-            f"**Правильный ответ: {question.correct_answer}.** {correct_option_text}\n\n"
-            f"**Объяснение:** {explanation}"
-        )
+    result_message = (_CORRECT_ANSWER_TMPL if is_correct else _WRONG_ANSWER_TMPL).format(
+        letter=question.correct_answer,
+        option=escape_md(correct_option_text),
+        explanation=escape_md(explanation)
+    )
     
     # Отправляем результат
     await query.message.edit_text(
         result_message,
         parse_mode="Markdown",
-        reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("▶️ Продолжить", callback_data="next_question")]
-        ])
+        reply_markup=get_next_question_keyboard()
     )
 
 async def handle_next_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -773,7 +949,7 @@ async def handle_next_question(update: Update, context: ContextTypes.DEFAULT_TYP
     
     # Увеличиваем индекс текущего вопроса
     current_index = test_data.get('current_question_index', 0)
-    questions = test_data.get('questions', [])
+    questions = test_data.get('questions', ())
     
     next_index = current_index + 1
     
@@ -803,15 +979,7 @@ async def show_test_results(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user = query.from_user
     chat_id = query.message.chat_id
     
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
+    user_id = await cached_user_id(user)
     
     # Получаем данные теста
     test_data = context.user_data.get('current_test', {})
@@ -822,22 +990,19 @@ async def show_test_results(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if total_questions == 0:
         await query.message.edit_text(
             "⚠️ Произошла ошибка при подсчете результатов.",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🏠 Главное меню", callback_data="back_to_main")]
-            ])
+            reply_markup=get_back_to_menu_keyboard()
         )
         return
     
     # Вычисляем процент успешности
     success_percentage = (correct_answers / total_questions) * 100.0
     
-    # Обновляем прогресс пользователя
+    # Прогресс и следующий урок - одной транзакцией; урок берется из кэша параллельно
     is_successful = success_percentage >= MIN_SUCCESS_PERCENTAGE
-    update_user_progress(db, db_user.id, lesson_id, is_successful, success_percentage)
-    
-    # Получаем урок и следующий урок
-    lesson = get_lesson(db, lesson_id)
-    next_lesson = get_next_lesson(db, lesson_id)
+    next_lesson, lesson = await asyncio.gather(
+        run_db(record_test_result, user_id, lesson_id, is_successful, success_percentage),
+        cached_get_lesson(lesson_id)
+    )
     
     # Отправляем стикер в зависимости от результата
     try:
@@ -854,54 +1019,102 @@ async def show_test_results(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # Формируем сообщение с результатами
     progress_bar = get_progress_bar(success_percentage)
     
-    if is_successful:
-        result_message = (
-            f"🎉 **Поздравляем!** Вы успешно прошли урок \"{lesson.title}\".\n\n"
-            f"**Ваш результат:** {correct_answers} из {total_questions} "
-            f"({success_percentage:.1f}%)\n\n"
-            f"**Прогресс:** {progress_bar}\n\n"
-            "Вы можете перейти к следующему уроку или вернуться к списку уроков."
-        )
-    else:
-        result_message = (
-            f"📊 **Результаты теста по уроку** \"{lesson.title}\":\n\n"
-            f"Вы ответили правильно на {correct_answers} из {total_questions} "
-            f"вопросов ({success_percentage:.1f}%)\n\n"
-            f"**Прогресс:** {progress_bar}\n\n"
-            f"Для перехода к следующему уроку необходимо набрать не менее {MIN_SUCCESS_PERCENTAGE}%.\n"
-            "Рекомендуем повторить материал и пройти тест еще раз."
-        )
-    
-    # Создаем клавиатуру с кнопками действий
-    keyboard = []
-    
-    if is_successful and next_lesson:
-        keyboard.append([
-            InlineKeyboardButton("▶️ Следующий урок", callback_data=f"lesson_{next_lesson.id}")
-        ])
-    
-    keyboard.append([
-        InlineKeyboardButton("🔄 Пройти урок заново", callback_data=f"lesson_{lesson_id}")
-    ])
-    
-    keyboard.append([
-        InlineKeyboardButton("📋 К списку уроков", callback_data=f"course_{lesson.course_id}")
-    ])
+    result_message = (_TEST_PASSED_TMPL if is_successful else _TEST_FAILED_TMPL).format(
+        title=escape_md(lesson.title),
+        correct=correct_answers,
+        total=total_questions,
+        percentage=success_percentage,
+        progress_bar=progress_bar,
+        min_percentage=MIN_SUCCESS_PERCENTAGE
+    )
     
-    keyboard.append([
-        InlineKeyboardButton("🏠 Главное меню", callback_data="back_to_main")
-    ])
+    # Клавиатура с кнопками действий (кэшируется по уроку)
+    next_lesson_id = next_lesson.id if is_successful and next_lesson else None
+    keyboard = get_test_results_keyboard(lesson_id, lesson.course_id, next_lesson_id)
     
     # Отправляем сообщение с результатами
     await query.message.edit_text(
         result_message,
-        reply_markup=InlineKeyboardMarkup(keyboard),
+        reply_markup=keyboard,
         parse_mode="Markdown"
     )
     
     # Очищаем данные теста
     context.user_data.pop('current_test', None)
 
+# Таблицы маршрутизации callback-кнопок (длинные имена - для кнопок в ранее отправленных сообщениях)
+_EXACT_CALLBACKS = {
+    CB_MAIN_MENU: show_main_menu,
+    CB_COURSES: show_courses,
+    CB_NEXT_QUESTION: handle_next_question,
+    CB_PROGRESS: _menu_progress,
+    "main_menu": show_main_menu,
+    "back_to_main": show_main_menu,
+    "courses": show_courses,
+    "back_to_courses": show_courses,
+    "next_question": handle_next_question,
+    "progress": _menu_progress,
+}
+
+_ID_CALLBACKS = {
+    CB_COURSE: show_course_lessons,
+    CB_COURSE_INFO: show_course_lessons,
+    CB_LESSON: show_lesson_content,
+    CB_START_TEST: start_lesson_test,
+    CB_ASK_QUESTION: handle_user_question,
+    CB_NEXT_IN_LESSON: handle_next_question_in_lesson,
+    CB_RETRY_QUESTION: retry_question,
+    "course": show_course_lessons,
+    "lesson": show_lesson_content,
+    "start_test": start_lesson_test,
+    "ask_question": handle_user_question,
+    "next_question": handle_next_question_in_lesson,
+    "retry_question": retry_question,
+}
+
+async def _post_init(application: Application) -> None:
+    """Инициализирует пул БД после создания приложения."""
+    application.bot_data['db_pool'] = init_pool()
+    if application.job_queue:
+        _schedule_activity_flush(application.job_queue)
+
+async def _post_shutdown(application: Application) -> None:
+    """Освобождает пул БД при остановке бота."""
+    await _flush_activity()
+    application.bot_data.pop('db_pool', None)
+    close_pool()
+
+def register_handlers(application: Application) -> None:
+    """Регистрирует обработчики бота (сессия БД на обновление открывается в самих обработчиках через with_db)."""
+    # Активность пользователя отмечается один раз до остальных обработчиков
+    application.add_handler(TypeHandler(Update, _track_activity), group=-1)
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(CallbackQueryHandler(handle_callback))
+
+def build_application(token: str = TELEGRAM_TOKEN) -> Application:
+    """Создает приложение бота с общими для всех точек входа настройками.
+    
+    Пул БД и периодическая запись активности поднимаются при старте (post_init),
+    остаток активности записывается и пул закрывается при остановке (post_shutdown).
+    """
+    # Обновления разных пользователей обрабатываются параллельно (не больше
+    # CONCURRENT_UPDATES, чтобы не исчерпать пул БД), порядок внутри одного
+    # чата сохраняют блокировки чатов
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+    )
+    try:
+        builder = builder.rate_limiter(AIORateLimiter(max_retries=3))
+    except RuntimeError as e:
+        # Требуется python-telegram-bot[rate-limiter]
+        logger.warning(f"Ограничитель частоты запросов недоступен: {e}")
+    return builder.build()
+
 def run_bot(error_handler=None):
     """Запускает Telegram бота."""
     logger.info("Инициализация бота...")
@@ -909,17 +1122,15 @@ def run_bot(error_handler=None):
     # Инициализация данных
     init_data()
     
-    # Создание приложения
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    # Создание приложения; пул БД поднимается один раз при старте
+    application = build_application()
     
     # Добавление обработчика ошибок, если предоставлен
     if error_handler:
         application.add_error_handler(error_handler)
     
     # Добавление обработчиков
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-    application.add_handler(CallbackQueryHandler(handle_callback))
+    register_handlers(application)
     
     # Запуск бота
     logger.info("Запуск бота...")
@@ -8,26 +8,33 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from app.config import START_COMMANDS
-from app.database.models import get_db
-from app.database.operations import (
-    get_or_create_user,
-    update_user_activity,
-    get_all_courses
-)
+from app.database.cache import cached_get_all_courses
 from app.bot.keyboards import (
     get_main_menu_keyboard,
-    get_courses_keyboard
+    get_courses_keyboard,
+    parse_callback_id,
+    CB_ASK_QUESTION,
+    MENU_LEARN,
+    MENU_PROGRESS,
+    MENU_INSTRUCTIONS,
+    INSTRUCTIONS_TEXT
 )
 from app.bot.handlers_menu import show_progress
 
 logger = logging.getLogger(__name__)
 
+# Команды запуска и пункты меню в нижнем регистре (вычисляются один раз)
+_START_COMMANDS_LC = frozenset(cmd.casefold() for cmd in START_COMMANDS)
+_MENU_LEARN_LC = MENU_LEARN.casefold()
+_MENU_PROGRESS_LC = MENU_PROGRESS.casefold()
+_MENU_INSTRUCTIONS_LC = MENU_INSTRUCTIONS.casefold()
+
 async def handle_ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает нажатие кнопки "Задать вопрос по уроку"."""
     query = update.callback_query
     
     # Получаем ID урока из callback_data
-    lesson_id = int(query.data.replace("ask_question_", ""))
+    _, lesson_id = parse_callback_id(query.data)
     
     # Пытаемся импортировать функцию из handlers_lesson
     try:
@@ -43,22 +50,35 @@ async def handle_ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE
             ])
         )
 
+async def _menu_courses(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Пункт меню «Обучение»: список тем."""
+    courses = await cached_get_all_courses()
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text="Выберите тему для изучения:",
+        reply_markup=get_courses_keyboard(courses)
+    )
+
+async def _menu_instructions(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Пункт меню «Инструкция»."""
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=INSTRUCTIONS_TEXT,
+        parse_mode="Markdown"
+    )
+
+# Пункты меню (в нижнем регистре) -> обработчик
+_MENU_ACTIONS = {
+    _MENU_LEARN_LC: _menu_courses,
+    _MENU_PROGRESS_LC: show_progress,
+    _MENU_INSTRUCTIONS_LC: _menu_instructions,
+}
+
 async def handle_message_with_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает текстовые сообщения с учетом возможного вопроса по уроку."""
     chat_id = update.effective_chat.id
-    user = update.effective_user
-    message_text = update.message.text.lower()
-    
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    update_user_activity(db, db_user.id)
+    # Нормализуем так же, как ключи таблиц команд и меню (регистр и пробелы по краям)
+    message_text = update.message.text.strip().casefold()
     
     # Проверяем, ожидаем ли вопрос от пользователя
     if context.user_data.get('waiting_for_question', False):
@@ -77,60 +97,15 @@ async def handle_message_with_question(update: Update, context: ContextTypes.DEF
             return
     
     # Обработка команд запуска
-    if message_text in [cmd.lower() for cmd in START_COMMANDS]:
+    if message_text in _START_COMMANDS_LC:
         from app.bot.handlers import start
         await start(update, context)
         return
     
     # Обработка выбора пункта меню
-    if message_text == "📚 обучение":
-        courses = get_all_courses(db)
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text="Выберите тему для изучения:",
-            reply_markup=get_courses_keyboard(courses)
-        )
-    
-    elif message_text == "📊 мой прогресс":
-        await show_progress(update, context)
-    
-    elif message_text == "ℹ️ инструкция":
-        instructions = (
-            "📋 **Инструкция по работе с ботом**\n\n"
-            "1️⃣ **Структура обучения**:\n"
-            "   • Обучение разделено на темы\n"
-            "   • Каждая тема содержит несколько уроков\n"
-            "   • После каждого урока вы ответите на вопросы\n\n"
-            
-            "2️⃣ **Прохождение уроков**:\n"
-            "   • Уроки открываются последовательно\n"
-            "   • Для перехода к следующему уроку необходимо правильно ответить на 80% вопросов\n"
-            "   • Урок можно проходить повторно\n\n"
-            
-            "3️⃣ **Ответы на вопросы**:\n"
-            "   • После каждого урока вам будет предложено ответить на 3 вопроса\n"
-            "   • Выбирайте один из предложенных вариантов ответа\n"
-            "   • После ответа вы получите объяснение\n"
-            "   • При неправильном ответе вы получите дополнительные пояснения\n\n"
-            
-            "4️⃣ **Интерактивные возможности**:\n"
-            "   • Вы можете задавать вопросы по материалу урока\n"
-            "   • Система адаптируется к вашему уровню знаний\n"
-            "   • Сложность и объяснения подстраиваются под ваши потребности\n\n"
-            
-            "5️⃣ **Прогресс обучения**:\n"
-            "   • В разделе 'Мой прогресс' вы можете увидеть пройденные и доступные уроки\n"
-            "   • Прогресс обучения сохраняется между сессиями\n\n"
-            
-            "Желаем успешного обучения! 🚀"
-        )
-        
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=instructions,
-            parse_mode="Markdown"
-        )
-    
+    action = _MENU_ACTIONS.get(message_text)
+    if action:
+        await action(update, context)
     else:
         # Если не распознали команду, предлагаем варианты
         await context.bot.send_message(
@@ -153,7 +128,7 @@ def update_callback_handler(original_handler):
             await query.answer()
             
             # Добавляем обработку новых типов callback данных
-            if callback_data.startswith("ask_question_"):
+            if parse_callback_id(callback_data)[0] in (CB_ASK_QUESTION, "ask_question"):
                 await handle_ask_question(update, context)
                 return
             
@@ -161,9 +136,7 @@ def update_callback_handler(original_handler):
             await original_handler(update, context)
             
         except Exception as e:
-            logger.error(f"Ошибка при обработке callback: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception(f"Ошибка при обработке callback: {e}")
             try:
                 await query.message.reply_text(
                     "Произошла ошибка при обработке запроса. Пожалуйста, попробуйте еще раз."
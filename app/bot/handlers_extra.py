@@ -3,7 +3,6 @@
 Исправленная версия с улучшенным форматированием вопросов.
 """
 import logging
-import json
 import asyncio
 from typing import Dict, Any, List, Optional, Tuple, Union
 
@@ -17,28 +16,39 @@ from app.bot.stickers import (
     send_lesson_fail_sticker,
     send_topic_success_sticker
 )
-from app.database.models import get_db
+from app.database.cache import cached_get_lesson, cached_get_question, cached_user_id
+from app.database.pool import run_db
 from app.database.operations import (
-    get_or_create_user,
-    get_question,
-    get_lesson,
-    get_next_lesson,
-    update_user_progress
-)
-from app.learning.questions import (
-    check_answer,
-    get_explanation,
-    get_questions_by_lesson
+    get_questions_by_lesson,
+    record_test_result,
+    save_user_answer
 )
 from app.bot.keyboards import (
+    ANSWER_LETTERS,
+    DIFFICULTY_ICONS,
     get_progress_bar,
     get_wrong_answer_keyboard,
-    get_question_options_keyboard
+    get_question_options_keyboard,
+    parse_callback_id,
+    CB_NEXT_QUESTION
 )
 from app.config import MIN_SUCCESS_PERCENTAGE
 
 logger = logging.getLogger(__name__)
 
+class LessonState:
+    """Состояние прохождения урока пользователем (хранится в context.user_data['lesson_data'])."""
+    __slots__ = ("current_question", "correct_answers", "wrong_answers_streak")
+    
+    def __init__(self, current_question: int = 0, correct_answers: int = 0, wrong_answers_streak: int = 0):
+        self.current_question = current_question
+        self.correct_answers = correct_answers
+        self.wrong_answers_streak = wrong_answers_streak
+
+def _get_lesson_state(context: ContextTypes.DEFAULT_TYPE, lesson_id: int) -> Optional[LessonState]:
+    """Возвращает состояние урока из контекста пользователя, если оно есть."""
+    return context.user_data.get('lesson_data', {}).get(lesson_id)
+
 def format_question_with_options(question_text: str, options: list) -> str:
     """
     Форматирует вопрос с вариантами ответов для красивого отображения.
@@ -52,11 +62,9 @@ def format_question_with_options(question_text: str, options: list) -> str:
     """
     formatted = f"❓ **{question_text}**\n\n"
     
-    letters = ['A', 'B', 'C', 'D', 'E', 'F']  # На случай, если будет больше 4 вариантов
-    
     for i, option in enumerate(options):
-        if i < len(letters):
-            formatted += f"**{letters[i]}.** {option}\n\n"
+        if i < len(ANSWER_LETTERS):
+            formatted += f"**{ANSWER_LETTERS[i]}.** {option}\n\n"
     
     return formatted.rstrip()  # Убираем последние лишние переносы
 
@@ -71,14 +79,13 @@ def create_answer_keyboard(question_id: int, num_options: int):
     Returns:
         InlineKeyboardMarkup с кнопками вариантов ответов
     """
-    letters = ['A', 'B', 'C', 'D', 'E', 'F']
     buttons = []
     
     # Создаем кнопки для каждого варианта
-    for i in range(min(num_options, len(letters))):
+    for i in range(min(num_options, len(ANSWER_LETTERS))):
         button = InlineKeyboardButton(
-            text=f"🔘 {letters[i]}",
-            callback_data=f"answer_{question_id}_{letters[i]}"
+            text=f"🔘 {ANSWER_LETTERS[i]}",
+            callback_data=f"answer_{question_id}_{ANSWER_LETTERS[i]}"
         )
         buttons.append([button])
     
@@ -87,35 +94,18 @@ def create_answer_keyboard(question_id: int, num_options: int):
 async def handle_answer_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, question_id: int, answer_letter: str) -> None:
     """Обрабатывает выбор варианта ответа пользователем."""
     query = update.callback_query
-    user = query.from_user
     chat_id = query.message.chat_id
     
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    
     try:
-        # Получаем вопрос из базы данных
-        question = get_question(db, question_id)
+        # Получаем вопрос (из кэша или базы данных)
+        question = await cached_get_question(question_id)
         if not question:
             logger.error(f"Вопрос с ID {question_id} не найден")
             await query.message.reply_text("Произошла ошибка при получении вопроса.")
             return
         
         # Получаем варианты ответов
-        if isinstance(question.options, str):
-            try:
-                options = json.loads(question.options)
-            except:
-                options = [opt.strip() for opt in question.options.split('\n') if opt.strip()]
-        else:
-            options = question.options
+        options = question.options_list
         
         # Находим текст выбранного варианта
         option_index = ord(answer_letter) - ord('A')
@@ -141,9 +131,7 @@ async def handle_answer_selection(update: Update, context: ContextTypes.DEFAULT_
         await check_answer_and_respond(update, context, question_id, answer_letter)
         
     except Exception as e:
-        logger.error(f"Ошибка при обработке выбора ответа: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception(f"Ошибка при обработке выбора ответа: {e}")
         await query.message.reply_text("Произошла ошибка при обработке ответа. Пожалуйста, попробуйте еще раз.")
 
 async def check_answer_and_respond(update: Update, context: ContextTypes.DEFAULT_TYPE, question_id: int, answer_letter: str) -> None:
@@ -152,67 +140,54 @@ async def check_answer_and_respond(update: Update, context: ContextTypes.DEFAULT
     user = query.from_user
     chat_id = query.message.chat_id
     
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    
     try:
-        # Проверяем ответ
-        is_correct = check_answer(question_id, db_user.id, answer_letter)
-        
-        # Получаем объяснение
-        explanation = get_explanation(question_id)
-        
-        # Получаем текущий вопрос для определения, к какому уроку он относится
-        question = get_question(db, question_id)
+        # Пользователь и вопрос (вопрос берется из кэша)
+        user_id, question = await asyncio.gather(cached_user_id(user), cached_get_question(question_id))
         
         if not question:
             logger.error(f"Вопрос с ID {question_id} не найден")
             await query.message.reply_text("Произошла ошибка при получении вопроса.")
             return
         
-        # Получаем данные урока
+        # Проверяем ответ и сохраняем его
+        is_correct = answer_letter == question.correct_answer
+        try:
+            await run_db(save_user_answer, user_id, question_id, answer_letter, is_correct, question.lesson_id)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении ответа пользователя: {e}")
+        
+        # Получаем объяснение
+        explanation = question.explanation or "Объяснение недоступно."
+        
+        # Урок, к которому относится вопрос
         lesson_id = question.lesson_id
-        lesson = get_lesson(db, lesson_id)
         
-        # Обновляем счетчики в контексте
-        context.user_data.setdefault('lesson_data', {})
-        context.user_data['lesson_data'].setdefault(lesson_id, {
-            'current_question': 0,
-            'correct_answers': 0,
-            'wrong_answers_streak': 0
-        })
+        # Обновляем счетчики в контексте (словарь состояния создается только при отсутствии)
+        lesson_states = context.user_data.get('lesson_data')
+        if lesson_states is None:
+            context.user_data['lesson_data'] = lesson_states = {}
+        lesson_state = lesson_states.get(lesson_id)
+        if lesson_state is None:
+            lesson_state = lesson_states[lesson_id] = LessonState()
         
         # Получаем текущий индекс вопроса
-        all_questions = get_questions_by_lesson(db, lesson_id)
+        all_questions = await run_db(get_questions_by_lesson, lesson_id)
         question_ids = [q.id for q in all_questions]
         current_idx = question_ids.index(question_id) if question_id in question_ids else 0
         
         # Обновляем счетчики ответов
         if is_correct:
-            context.user_data['lesson_data'][lesson_id]['correct_answers'] = context.user_data['lesson_data'][lesson_id].get('correct_answers', 0) + 1
-            context.user_data['lesson_data'][lesson_id]['wrong_answers_streak'] = 0
+            lesson_state.correct_answers += 1
+            lesson_state.wrong_answers_streak = 0
         else:
-            context.user_data['lesson_data'][lesson_id]['wrong_answers_streak'] = context.user_data['lesson_data'][lesson_id].get('wrong_answers_streak', 0) + 1
+            lesson_state.wrong_answers_streak += 1
         
         # Получаем варианты ответов для отображения правильного варианта
-        if isinstance(question.options, str):
-            try:
-                options = json.loads(question.options)
-            except:
-                options = [opt.strip() for opt in question.options.split('\n') if opt.strip()]
-        else:
-            options = question.options
+        options = question.options_list
         
         # Отправляем стикер в зависимости от результата
         if is_correct:
-            if context.user_data['lesson_data'][lesson_id].get('correct_answers', 0) == 1:
+            if lesson_state.correct_answers == 1:
                 await send_correct_answer_sticker(context, chat_id, is_first=True)
             else:
                 await send_correct_answer_sticker(context, chat_id, is_first=False)
@@ -257,7 +232,7 @@ async def check_answer_and_respond(update: Update, context: ContextTypes.DEFAULT
                 
         else:
             # Для неправильного ответа, отправляем стикер
-            if context.user_data['lesson_data'][lesson_id].get('wrong_answers_streak', 0) == 1:
+            if lesson_state.wrong_answers_streak == 1:
                 await send_wrong_answer_sticker(context, chat_id, is_first=True)
             else:
                 await send_wrong_answer_sticker(context, chat_id, is_first=False)
@@ -292,31 +267,16 @@ async def check_answer_and_respond(update: Update, context: ContextTypes.DEFAULT
             )
             
     except Exception as e:
-        logger.error(f"Ошибка при проверке ответа: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception(f"Ошибка при проверке ответа: {e}")
         await query.message.reply_text("Произошла ошибка при проверке ответа. Пожалуйста, попробуйте еще раз.")
 
 async def send_question(update: Update, context: ContextTypes.DEFAULT_TYPE, lesson_id: int = None, question_id: int = None) -> None:
     """Отправляет вопрос пользователю с улучшенным форматированием."""
     # Если это callback query, получаем данные из него
     if update.callback_query:
-        query = update.callback_query
-        chat_id = query.message.chat_id
-        user = query.from_user
+        chat_id = update.callback_query.message.chat_id
     else:
         chat_id = update.effective_chat.id
-        user = update.effective_user
-    
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
     
     # Если question_id не указан, проверяем контекст
     if question_id is None:
@@ -325,7 +285,7 @@ async def send_question(update: Update, context: ContextTypes.DEFAULT_TYPE, less
     
     # Если question_id все еще None, берем первый вопрос урока
     if question_id is None and lesson_id:
-        questions = get_questions_by_lesson(db, lesson_id)
+        questions = await run_db(get_questions_by_lesson, lesson_id)
         if not questions:
             # Если нет вопросов для урока, сообщаем об ошибке
             await context.bot.send_message(
@@ -335,8 +295,8 @@ async def send_question(update: Update, context: ContextTypes.DEFAULT_TYPE, less
             return
         question_id = questions[0].id
     
-    # Получаем вопрос из базы данных
-    question = get_question(db, question_id)
+    # Получаем вопрос (из кэша или базы данных)
+    question = await cached_get_question(question_id)
     if not question:
         await context.bot.send_message(
             chat_id=chat_id,
@@ -349,32 +309,21 @@ async def send_question(update: Update, context: ContextTypes.DEFAULT_TYPE, less
         lesson_id = question.lesson_id
     
     # Определяем номер вопроса
-    questions = get_questions_by_lesson(db, lesson_id)
+    questions = await run_db(get_questions_by_lesson, lesson_id)
     question_ids = [q.id for q in questions]
     current_idx = question_ids.index(question_id) if question_id in question_ids else 0
     question_number = current_idx + 1
     total_questions = len(questions)
     
     # Парсим варианты ответов
-    if isinstance(question.options, str):
-        try:
-            options = json.loads(question.options)
-        except:
-            options = [opt.strip() for opt in question.options.split('\n') if opt.strip()]
-    else:
-        options = question.options
+    options = question.options_list
     
     # Добавляем информацию о прогрессе
     progress_text = f"📊 Вопрос {question_number} из {total_questions}\n\n"
     
     # Добавляем индикатор сложности
-    difficulty_map = {
-        "легкий": "⭐",
-        "средний": "⭐⭐", 
-        "сложный": "⭐⭐⭐"
-    }
     difficulty = getattr(question, 'difficulty', 'средний')
-    difficulty_indicator = difficulty_map.get(difficulty, "⭐⭐")
+    difficulty_indicator = DIFFICULTY_ICONS.get(difficulty, "⭐⭐")
     difficulty_text = f"{difficulty_indicator} **Сложность:** {difficulty}\n\n"
     
     # Форматируем вопрос с вариантами ответов
@@ -406,11 +355,10 @@ async def handle_retry_question(update: Update, context: ContextTypes.DEFAULT_TY
     chat_id = query.message.chat_id
     
     # Получаем ID вопроса из callback_data
-    question_id = int(query.data.replace("retry_question_", ""))
+    _, question_id = parse_callback_id(query.data)
     
     # Отправляем вопрос заново
-    db = get_db()
-    question = get_question(db, question_id)
+    question = await cached_get_question(question_id)
     if not question:
         await query.message.reply_text("Ошибка: не удалось найти вопрос.")
         return
@@ -424,7 +372,7 @@ async def handle_next_question(update: Update, context: ContextTypes.DEFAULT_TYP
     chat_id = query.message.chat_id
     
     # Проверяем тип callback_data
-    if query.data == "next_question":
+    if query.data in (CB_NEXT_QUESTION, "next_question"):
         # Используем данные из контекста
         question_id = context.user_data.get('next_question_id')
         lesson_id = context.user_data.get('lesson_id')
@@ -437,17 +385,16 @@ async def handle_next_question(update: Update, context: ContextTypes.DEFAULT_TYP
             await query.message.reply_text("Ошибка: не удалось найти следующий вопрос.")
         return
     
-    # Старый формат callback_data
-    if query.data.startswith("next_question_"):
-        lesson_id = int(query.data.replace("next_question_", ""))
-        
+    # callback_data с ID урока
+    _, lesson_id = parse_callback_id(query.data)
+    if lesson_id is not None:
         # Получаем все вопросы для урока
-        db = get_db()
-        questions = get_questions_by_lesson(db, lesson_id)
+        questions = await run_db(get_questions_by_lesson, lesson_id)
         question_ids = [q.id for q in questions]
         
         # Определяем текущий индекс вопроса
-        current_idx = context.user_data.get('lesson_data', {}).get(lesson_id, {}).get('current_question', 0)
+        lesson_state = _get_lesson_state(context, lesson_id)
+        current_idx = lesson_state.current_question if lesson_state else 0
         
         # Увеличиваем индекс для перехода к следующему вопросу
         next_idx = current_idx + 1
@@ -455,8 +402,8 @@ async def handle_next_question(update: Update, context: ContextTypes.DEFAULT_TYP
         # Если есть следующий вопрос, отправляем его
         if next_idx < len(question_ids):
             # Обновляем текущий индекс вопроса в контексте
-            if lesson_id in context.user_data.get('lesson_data', {}):
-                context.user_data['lesson_data'][lesson_id]['current_question'] = next_idx
+            if lesson_state:
+                lesson_state.current_question = next_idx
             
             # Отправляем следующий вопрос
             await send_question(update, context, lesson_id, question_ids[next_idx])
@@ -475,26 +422,17 @@ async def show_lesson_results(update: Update, context: ContextTypes.DEFAULT_TYPE
         chat_id = update.effective_chat.id
         user = update.effective_user
     
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
+    # Пользователь, урок (из кэша) и все вопросы урока
+    user_id, lesson, questions = await asyncio.gather(
+        cached_user_id(user),
+        cached_get_lesson(lesson_id),
+        run_db(get_questions_by_lesson, lesson_id)
     )
-    
-    # Получаем урок и следующий урок
-    lesson = get_lesson(db, lesson_id)
-    next_lesson = get_next_lesson(db, lesson_id)
-    
-    # Получаем все вопросы для урока
-    questions = get_questions_by_lesson(db, lesson_id)
     total_questions = len(questions)
     
     # Получаем количество правильных ответов из контекста
-    correct_answers = context.user_data.get('lesson_data', {}).get(lesson_id, {}).get('correct_answers', 0)
+    lesson_state = _get_lesson_state(context, lesson_id)
+    correct_answers = lesson_state.correct_answers if lesson_state else 0
     
     # Вычисляем процент успешности
     if total_questions > 0:
@@ -505,8 +443,8 @@ async def show_lesson_results(update: Update, context: ContextTypes.DEFAULT_TYPE
     # Определяем, успешно ли пройден урок
     is_successful = success_percentage >= MIN_SUCCESS_PERCENTAGE
     
-    # Обновляем прогресс пользователя в базе данных
-    update_user_progress(db, db_user.id, lesson_id, is_successful, success_percentage)
+    # Обновляем прогресс пользователя и получаем следующий урок одной транзакцией
+    next_lesson = await run_db(record_test_result, user_id, lesson_id, is_successful, success_percentage)
     
     # Формируем прогресс-бар
     progress_bar = get_progress_bar(success_percentage)
@@ -568,8 +506,7 @@ async def show_lesson_results(update: Update, context: ContextTypes.DEFAULT_TYPE
     )
     
     # Очищаем данные теста
-    if lesson_id in context.user_data.get('lesson_data', {}):
-        del context.user_data['lesson_data'][lesson_id]
+    context.user_data.get('lesson_data', {}).pop(lesson_id, None)
 
 def format_explanation(explanation: str) -> str:
     """Форматирует объяснение с переносами строк для лучшей читаемости."""
@@ -3,29 +3,29 @@
 Полная исправленная версия с улучшенной обработкой ошибок.
 """
 import logging
-import json
 import asyncio
-import requests
 from typing import Dict, Any, List, Optional
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from app.config import LLM_MODEL_PATH, MIN_SUCCESS_PERCENTAGE
-from app.database.models import get_db
+from app.database.cache import (
+    cached_get_course,
+    cached_get_lesson,
+    cached_get_question,
+    cached_user_id
+)
+from app.database.pool import init_pool, run_db
 from app.database.operations import (
-    get_or_create_user,
-    update_user_activity,
-    get_lesson_by_id,
-    get_lesson,
-    get_course,
-    get_next_lesson,
     get_or_create_user_progress,
-    update_user_progress,
-    get_question,
-    get_questions_by_lesson
+    record_test_result,
+    get_questions_by_lesson,
+    save_user_answer
 )
 from app.bot.keyboards import (
+    ANSWER_LETTERS,
+    DIFFICULTY_ICONS,
     get_question_options_keyboard,
     get_continue_keyboard,
     get_lessons_keyboard,
@@ -39,11 +39,7 @@ from app.bot.stickers import (
     send_topic_success_sticker,
     send_lesson_fail_sticker
 )
-from app.learning.questions import (
-    generate_questions_for_lesson,
-    check_answer,
-    get_explanation
-)
+from app.learning.questions import generate_questions_for_lesson
 
 # Импортируем агенты с обработкой ошибок
 try:
@@ -55,6 +51,21 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Ключи context.user_data, которые живут только во время теста по уроку
+_TEST_KEYS = (
+    'current_question',
+    'questions',
+    'lesson_id',
+    'correct_answers',
+    'wrong_answers_streak',
+    'adaptive_learning',
+    'user_level',
+    'misconceptions',
+    'current_lesson_id',
+    'lesson_context',
+    'waiting_for_question'
+)
+
 def get_lesson_context(lesson_content: str, lesson_title: str) -> str:
     """Формирует контекст урока для ИИ."""
     return f"""
@@ -71,6 +82,9 @@ def get_lesson_context(lesson_content: str, lesson_title: str) -> str:
 
 async def ask_llm_question(question: str, lesson_context: str) -> str:
     """Отправляет вопрос в LM Studio и получает ответ."""
+    # requests нужен только для вопросов к LM Studio - не загружаем его при запуске бота
+    import requests
+    
     try:
         headers = {"Content-Type": "application/json"}
         
@@ -151,11 +165,9 @@ def format_question_with_options(question_text: str, options: list) -> str:
     """
     formatted = f"❓ **{question_text}**\n\n"
     
-    letters = ['A', 'B', 'C', 'D', 'E', 'F']  # На случай, если будет больше 4 вариантов
-    
     for i, option in enumerate(options):
-        if i < len(letters):
-            formatted += f"**{letters[i]}.** {option}\n\n"
+        if i < len(ANSWER_LETTERS):
+            formatted += f"**{ANSWER_LETTERS[i]}.** {option}\n\n"
     
     return formatted.rstrip()  # Убираем последние лишние переносы
 
@@ -170,14 +182,13 @@ def create_answer_keyboard(question_id: int, num_options: int):
     Returns:
         InlineKeyboardMarkup с кнопками вариантов ответов
     """
-    letters = ['A', 'B', 'C', 'D', 'E', 'F']
     buttons = []
     
     # Создаем кнопки для каждого варианта
-    for i in range(min(num_options, len(letters))):
+    for i in range(min(num_options, len(ANSWER_LETTERS))):
         button = InlineKeyboardButton(
-            text=f"🔘 {letters[i]}",
-            callback_data=f"answer_{question_id}_{letters[i]}"
+            text=f"🔘 {ANSWER_LETTERS[i]}",
+            callback_data=f"answer_{question_id}_{ANSWER_LETTERS[i]}"
         )
         buttons.append([button])
     
@@ -189,25 +200,15 @@ async def show_lesson(update: Update, context: ContextTypes.DEFAULT_TYPE, lesson
     user = query.from_user
     chat_id = query.message.chat_id
     
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    
-    # Получаем урок
-    lesson = get_lesson(db, lesson_id)
+    # Пользователь и урок (урок берется из кэша)
+    user_id, lesson = await asyncio.gather(cached_user_id(user), cached_get_lesson(lesson_id))
     
     if not lesson:
         await query.message.reply_text("⚠️ Урок не найден.")
         return
     
     # Создаем или получаем прогресс пользователя по уроку
-    progress = get_or_create_user_progress(db, db_user.id, lesson_id)
+    await run_db(get_or_create_user_progress, user_id, lesson_id)
     
     # Удаляем предыдущее сообщение
     try:
@@ -256,21 +257,9 @@ async def show_lesson(update: Update, context: ContextTypes.DEFAULT_TYPE, lesson
 async def handle_user_question(update: Update, context: ContextTypes.DEFAULT_TYPE, lesson_id: int) -> None:
     """Обрабатывает начало диалога для вопроса по уроку."""
     query = update.callback_query
-    user = update.effective_user
-    
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    update_user_activity(db, db_user.id)
     
     # Получаем урок
-    lesson = get_lesson_by_id(db, lesson_id)
+    lesson = await cached_get_lesson(lesson_id)
     if not lesson:
         await query.message.edit_text(
             "❌ Урок не найден.",
@@ -301,23 +290,11 @@ async def handle_user_question(update: Update, context: ContextTypes.DEFAULT_TYP
 async def process_user_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Обрабатывает вопрос пользователя и генерирует ответ."""
     user_question = update.message.text
-    user = update.effective_user
     
     # Проверяем, ожидаем ли мы вопрос
     if not context.user_data.get('waiting_for_question', False):
         return
     
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    update_user_activity(db, db_user.id)
-    
     # Получаем контекст урока
     lesson_context = context.user_data.get('lesson_context', '')
     lesson_id = context.user_data.get('current_lesson_id', 0)
@@ -373,32 +350,22 @@ async def start_test(update: Update, context: ContextTypes.DEFAULT_TYPE, lesson_
     user = query.from_user
     chat_id = query.message.chat_id
     
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    
-    # Получаем урок
-    lesson = get_lesson(db, lesson_id)
+    # Пользователь и урок (урок берется из кэша)
+    user_id, lesson = await asyncio.gather(cached_user_id(user), cached_get_lesson(lesson_id))
     if not lesson:
         await query.message.edit_text("❌ Урок не найден.")
         return
     
-    # Получаем курс для определения темы
-    course = get_course(db, lesson.course_id)
-    
-    # Создаем или получаем прогресс пользователя по уроку
-    progress = get_or_create_user_progress(db, db_user.id, lesson_id)
+    # Курс для определения темы и прогресс пользователя по уроку
+    course, _ = await asyncio.gather(
+        cached_get_course(lesson.course_id),
+        run_db(get_or_create_user_progress, user_id, lesson_id)
+    )
     
     # Пытаемся использовать агентов для обучения
     try:
         if AGENTS_AVAILABLE:
-            learning_session = await agent_integration.start_learning_session(db_user.id, lesson_id)
+            learning_session = await agent_integration.start_learning_session(user_id, lesson_id)
             adaptive_learning = not learning_session.get("use_standard_flow", True)
         else:
             raise Exception("Агенты недоступны")
@@ -412,11 +379,13 @@ async def start_test(update: Update, context: ContextTypes.DEFAULT_TYPE, lesson_
     topic = course.name.lower().replace(" ", "_") if course else "risk_management"
     
     try:
-        questions = generate_questions_for_lesson(lesson_id, topic)
+        # Генерация работает с БД и базой знаний синхронно - выполняем ее вне цикла событий
+        loop = asyncio.get_running_loop()
+        questions = await loop.run_in_executor(init_pool(), generate_questions_for_lesson, lesson_id, topic)
     except Exception as e:
         logger.error(f"Ошибка при генерации вопросов: {e}")
         # Попробуем получить существующие вопросы из базы данных
-        questions = get_questions_by_lesson(db, lesson_id)
+        questions = await run_db(get_questions_by_lesson, lesson_id)
     
     if not questions:
         await query.message.edit_text(
@@ -455,10 +424,9 @@ async def send_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await show_test_results(update, context)
         return
     
-    # Получаем вопрос из базы данных
-    db = get_db()
+    # Получаем вопрос (из кэша или базы данных)
     question_id = questions[current_question_index]
-    question = get_question(db, question_id)
+    question = await cached_get_question(question_id)
     
     if not question:
         await query.message.edit_text(
@@ -467,13 +435,7 @@ async def send_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         return
     
     # Парсим опции
-    if isinstance(question.options, str):
-        try:
-            options = json.loads(question.options)
-        except:
-            options = [opt.strip() for opt in question.options.split('\n') if opt.strip()]
-    else:
-        options = question.options
+    options = question.options_list
     
     # Формируем сообщение с вопросом
     question_number = current_question_index + 1
@@ -487,13 +449,8 @@ async def send_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     progress_text = f"📊 Вопрос {question_number} из {total_questions}\n\n"
     
     # Добавляем индикатор сложности
-    difficulty_map = {
-        "легкий": "⭐",
-        "средний": "⭐⭐", 
-        "сложный": "⭐⭐⭐"
-    }
     difficulty = getattr(question, 'difficulty', 'средний')
-    difficulty_indicator = difficulty_map.get(difficulty, "⭐⭐")
+    difficulty_indicator = DIFFICULTY_ICONS.get(difficulty, "⭐⭐")
     
     # Если включено адаптивное обучение, добавляем информацию о пользовательском уровне
     if adaptive_learning:
@@ -526,26 +483,20 @@ async def process_question_answer(update: Update, context: ContextTypes.DEFAULT_
     user = query.from_user
     chat_id = query.message.chat_id
     
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    
-    # Получаем вопрос
-    question = get_question(db, question_id)
+    # Пользователь и вопрос (вопрос берется из кэша)
+    user_id, question = await asyncio.gather(cached_user_id(user), cached_get_question(question_id))
     if not question:
         await query.message.edit_text(
             "⚠️ Произошла ошибка при обработке ответа. Пожалуйста, попробуйте позже."
         )
         return
     
-    # Проверяем ответ
-    is_correct = check_answer(question_id, db_user.id, answer)
+    # Проверяем ответ и сохраняем его
+    is_correct = answer == question.correct_answer
+    try:
+        await run_db(save_user_answer, user_id, question_id, answer, is_correct, question.lesson_id)
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении ответа пользователя: {e}")
     
     # Адаптивное обучение
     adaptive_learning = context.user_data.get('adaptive_learning', False)
@@ -579,7 +530,7 @@ async def process_question_answer(update: Update, context: ContextTypes.DEFAULT_
         context.user_data['wrong_answers_streak'] = context.user_data.get('wrong_answers_streak', 0) + 1
     
     # Получаем объяснение
-    explanation = get_explanation(question_id)
+    explanation = question.explanation or "Объяснение недоступно."
     
     # Если адаптивное обучение включено и ответ неправильный, генерируем дополнительное объяснение
     additional_explanation = ""
@@ -587,8 +538,8 @@ async def process_question_answer(update: Update, context: ContextTypes.DEFAULT_
         try:
             # Получаем урок
             lesson_id = context.user_data.get('lesson_id')
-            lesson = get_lesson(db, lesson_id)
-            course = get_course(db, lesson.course_id)
+            lesson = await cached_get_lesson(lesson_id)
+            course = await cached_get_course(lesson.course_id)
             
             # Генерируем дополнительное объяснение
             topic = course.name.lower().replace(" ", "_")
@@ -604,7 +555,7 @@ async def process_question_answer(update: Update, context: ContextTypes.DEFAULT_
             logger.warning(f"Не удалось сгенерировать дополнительное объяснение: {e}")
     
     # Определяем правильный вариант ответа текстом
-    options = json.loads(question.options) if isinstance(question.options, str) else question.options
+    options = question.options_list
     correct_index = ord(question.correct_answer) - ord('A')
     correct_option_text = options[correct_index] if 0 <= correct_index < len(options) else ""
     
@@ -664,16 +615,6 @@ async def show_test_results(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user = query.from_user
     chat_id = query.message.chat_id
     
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    
     # Получаем данные теста
     lesson_id = context.user_data.get('lesson_id')
     correct_answers = context.user_data.get('correct_answers', 0)
@@ -690,15 +631,15 @@ async def show_test_results(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # Вычисляем процент успешности
     success_percentage = (correct_answers / total_questions) * 100.0
     
-    # Обновляем прогресс пользователя
-    update_user_progress(db, db_user.id, lesson_id, success_percentage >= MIN_SUCCESS_PERCENTAGE, success_percentage)
-    
     # Определяем, успешно ли пройден тест
     is_successful = success_percentage >= MIN_SUCCESS_PERCENTAGE
     
-    # Получаем урок и следующий урок
-    lesson = get_lesson(db, lesson_id)
-    next_lesson = get_next_lesson(db, lesson_id)
+    # Прогресс и следующий урок - одной транзакцией; урок берется из кэша параллельно
+    user_id = await cached_user_id(user)
+    next_lesson, lesson = await asyncio.gather(
+        run_db(record_test_result, user_id, lesson_id, is_successful, success_percentage),
+        cached_get_lesson(lesson_id)
+    )
     
     # Формируем сообщение с результатами
     if is_successful:
@@ -772,15 +713,7 @@ async def show_test_results(update: Update, context: ContextTypes.DEFAULT_TYPE)
         parse_mode="Markdown"
     )
     
-    # Очищаем данные теста
-    context.user_data.pop('current_question', None)
-    context.user_data.pop('questions', None)
-    context.user_data.pop('lesson_id', None)
-    context.user_data.pop('correct_answers', None)
-    context.user_data.pop('wrong_answers_streak', None)
-    context.user_data.pop('adaptive_learning', None)
-    context.user_data.pop('user_level', None)
-    context.user_data.pop('misconceptions', None)
-    context.user_data.pop('current_lesson_id', None)
-    context.user_data.pop('lesson_context', None)
-    context.user_data.pop('waiting_for_question', None)
\ No newline at end of file
+    # Очищаем данные теста (user_data нельзя заменить новым словарем - удаляем ключи на месте)
+    user_data = context.user_data
+    for key in _TEST_KEYS:
+        user_data.pop(key, None)
\ No newline at end of file
@@ -1,59 +1,55 @@
 """
 Модуль для обработки меню и навигации по урокам.
 """
+import asyncio
 import logging
 from typing import Dict, Any, List, Optional
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import ContextTypes
 
-from app.database.models import get_db
+from app.database.pool import run_db
+from app.database.cache import cached_user_id, cached_get_all_courses, cached_get_course
 from app.database.operations import (
-    get_or_create_user,
-    update_user_activity,
-    get_all_courses,
-    get_course,
-    get_lessons_by_course,
     get_user_progress,
     get_available_lessons,
-    get_course_progress
+    get_available_lessons_for_course
 )
 from app.bot.keyboards import (
     get_courses_keyboard,
     get_lessons_keyboard,
     get_available_lessons_keyboard,
-    get_progress_bar
+    get_progress_bar,
+    get_no_progress_keyboard
 )
 
 logger = logging.getLogger(__name__)
 
+def _course_progress_from_lessons(available_lessons_data: List[Dict[str, Any]]) -> Dict[int, float]:
+    """Считает процент пройденных уроков по каждой теме из данных get_available_lessons."""
+    totals: Dict[int, int] = {}
+    completed: Dict[int, int] = {}
+    for lesson_data in available_lessons_data:
+        course_id = lesson_data["lesson"].course_id
+        totals[course_id] = totals.get(course_id, 0) + 1
+        progress = lesson_data["progress"]
+        if progress and progress.is_completed:
+            completed[course_id] = completed.get(course_id, 0) + 1
+    return {course_id: completed.get(course_id, 0) / total * 100.0 for course_id, total in totals.items()}
+
 async def show_lessons(update: Update, context: ContextTypes.DEFAULT_TYPE, course_id: int) -> None:
     """Показывает список уроков темы."""
     query = update.callback_query
     user = query.from_user
     
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    
-    # Получаем тему и уроки
-    course = get_course(db, course_id)
-    lessons = get_lessons_by_course(db, course_id)
-    
-    # Определяем доступность уроков
-    available_lessons_data = get_available_lessons(db, db_user.id)
+    user_id = await cached_user_id(user)
     
-    # Фильтруем только уроки текущей темы
-    available_lessons_current_course = [
-        lesson_data for lesson_data in available_lessons_data
-        if lesson_data["course"].id == course_id
-    ]
+    # Получаем тему (из кэша), уроки темы и их доступность (выборка только по этой теме)
+    course, available_lessons_current_course = await asyncio.gather(
+        cached_get_course(course_id),
+        run_db(get_available_lessons_for_course, user_id, course_id)
+    )
+    lessons = [lesson_data["lesson"] for lesson_data in available_lessons_current_course]
     
     # Принудительно делаем первый урок первой темы доступным
     for lesson_data in available_lessons_current_course:
@@ -86,18 +82,10 @@ async def show_progress(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         user = update.effective_user
         message_obj = None
     
-    # Получаем пользователя из базы данных
-    db = get_db()
-    db_user = get_or_create_user(
-        db,
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
+    user_id = await cached_user_id(user)
     
-    # Получаем доступные уроки
-    available_lessons_data = get_available_lessons(db, db_user.id)
+    # Получаем доступные уроки (запрос выполняется вне цикла событий)
+    available_lessons_data = await run_db(get_available_lessons, user_id)
     
     # Принудительно делаем первый урок первой темы доступным
     for lesson_data in available_lessons_data:
@@ -108,21 +96,16 @@ async def show_progress(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     # Если нет данных о прогрессе, показываем сообщение
     if not available_lessons_data:
         message = "📊 *Ваш прогресс обучения*\n\nВы еще не начали обучение. Выберите тему и начните изучение!"
-        keyboard = InlineKeyboardMarkup([
-            [InlineKeyboardButton("📚 Начать обучение", callback_data="course_1")],
-            [InlineKeyboardButton("🏠 Главное меню", callback_data="back_to_main")]
-        ])
+        keyboard = get_no_progress_keyboard()
     else:
-        # Формируем сообщение с прогрессом
-        message = "📊 *Ваш прогресс обучения*\n\n"
-        
-        # Добавляем прогресс по темам
-        courses = get_all_courses(db)
-        for course in courses:
-            course_progress = get_course_progress(db, db_user.id, course.id)
-            message += f"📘 *{course.name}*: {get_progress_bar(course_progress)}\n\n"
-        
-        message += "Выберите урок для продолжения обучения:"
+        # Прогресс по темам считается по уже загруженным урокам, без запросов на каждую тему
+        courses = await cached_get_all_courses()
+        course_progress = _course_progress_from_lessons(available_lessons_data)
+        course_lines = "".join(
+            f"📘 *{course.name}*: {get_progress_bar(course_progress.get(course.id, 0.0))}\n\n"
+            for course in courses
+        )
+        message = f"📊 *Ваш прогресс обучения*\n\n{course_lines}Выберите урок для продолжения обучения:"
         
         # Создаем клавиатуру с доступными уроками
         keyboard = get_available_lessons_keyboard(available_lessons_data)
@@ -1,28 +1,121 @@
 """
 Модуль для создания клавиатур и меню в Telegram.
 """
+import functools
+import re
+from typing import Optional, Tuple
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+from telegram.helpers import escape_markdown
+
+# Готовые клавиатуры тем, ключ - кортеж (id, name) тем
+_courses_markup_cache = {}
+_COURSES_MARKUP_CACHE_SIZE = 32
+
+# Короткие коды callback_data (Telegram ограничивает callback_data 64 байтами,
+# а кнопки отправляются в каждой клавиатуре). Кнопки без ID:
+CB_MAIN_MENU = "m"
+CB_COURSES = "cs"
+CB_PROGRESS = "p"
+CB_NEXT_QUESTION = "nq"
+# Кнопки с ID: код + ID, например "l12"
+CB_COURSE = "c"
+CB_COURSE_INFO = "ci"
+CB_LESSON = "l"
+CB_START_TEST = "t"
+CB_ASK_QUESTION = "q"
+CB_NEXT_IN_LESSON = "n"
+CB_RETRY_QUESTION = "r"
+# Заблокированный урок (кнопка без действия)
+CB_LESSON_LOCKED = "lesson_locked"
+# Ответ на вопрос: код + ID вопроса + буква, например "a12B"
+CB_ANSWER = "a"
+
+# Форматы callback_data: "<код><ID>" и "a<ID вопроса><буква>"; старые
+# "<действие>_<ID>" и "answer_<ID>_<буква>" из ранее отправленных сообщений тоже разбираются
+_CALLBACK_ID_RE = re.compile(r"([a-z_]+?)_?(\d+)")
+_CALLBACK_ANSWER_RE = re.compile(r"(?:answer_|a)(\d+)_?([A-Z])")
+
+def parse_callback_id(data: str) -> Tuple[Optional[str], Optional[int]]:
+    """Разбирает callback_data вида "<код><ID>"; для другого формата возвращает (None, None)."""
+    match = _CALLBACK_ID_RE.fullmatch(data)
+    if match is None:
+        return None, None
+    return match.group(1), int(match.group(2))
+
+def parse_callback_answer(data: str) -> Tuple[Optional[int], Optional[str]]:
+    """Разбирает callback_data ответа "a<ID вопроса><буква>"; при ошибке возвращает (None, None)."""
+    match = _CALLBACK_ANSWER_RE.fullmatch(data)
+    if match is None:
+        return None, None
+    return int(match.group(1)), match.group(2)
+
+# Пункты главного меню
+MENU_LEARN = "📚 Обучение"
+MENU_PROGRESS = "📊 Мой прогресс"
+MENU_INSTRUCTIONS = "ℹ️ Инструкция"
+
+# Текст пункта меню «Инструкция» (неизменяем, поэтому формируется один раз)
+INSTRUCTIONS_TEXT = (
+    "📋 **Инструкция по работе с ботом**\n\n"
+    "1️⃣ **Структура обучения**:\n"
+    "   • Обучение разделено на темы\n"
+    "   • Каждая тема содержит несколько уроков\n"
+    "   • После каждого урока вы ответите на вопросы\n\n"
+    
+    "2️⃣ **Прохождение уроков**:\n"
+    "   • Уроки открываются последовательно\n"
+    "   • Для перехода к следующему уроку необходимо правильно ответить на 80% вопросов\n"
+    "   • Урок можно проходить повторно\n\n"
+    
+    "3️⃣ **Ответы на вопросы**:\n"
+    "   • После каждого урока вам будет предложено ответить на 3 вопроса\n"
+    "   • Выбирайте один из предложенных вариантов ответа\n"
+    "   • После ответа вы получите объяснение\n"
+    "   • При неправильном ответе вы получите дополнительные пояснения\n\n"
+    
+    "4️⃣ **Интерактивные возможности**:\n"
+    "   • Вы можете задавать вопросы по материалу урока\n"
+    "   • Система адаптируется к вашему уровню знаний\n"
+    "   • Сложность и объяснения подстраиваются под ваши потребности\n\n"
+    
+    "5️⃣ **Прогресс обучения**:\n"
+    "   • В разделе 'Мой прогресс' вы можете увидеть пройденные и доступные уроки\n"
+    "   • Прогресс обучения сохраняется между сессиями\n\n"
+    
+    "Желаем успешного обучения! 🚀"
+)
 
-# Главное меню
+# Главное меню (разметка неизменяема, поэтому создается один раз)
+@functools.lru_cache(maxsize=1)
 def get_main_menu_keyboard():
     """Создает клавиатуру главного меню."""
     keyboard = [
-        [KeyboardButton("📚 Обучение")],
-        [KeyboardButton("📊 Мой прогресс"), KeyboardButton("ℹ️ Инструкция")]
+        [KeyboardButton(MENU_LEARN)],
+        [KeyboardButton(MENU_PROGRESS), KeyboardButton(MENU_INSTRUCTIONS)]
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 # Меню обучения
 def get_courses_keyboard(courses):
     """Создает инлайн-клавиатуру с темами обучения."""
+    key = tuple((course.id, course.name) for course in courses)
+    markup = _courses_markup_cache.get(key)
+    if markup is None:
+        if len(_courses_markup_cache) >= _COURSES_MARKUP_CACHE_SIZE:
+            _courses_markup_cache.clear()
+        markup = _courses_markup_cache[key] = _build_courses_keyboard(courses)
+    return markup
+
+def _build_courses_keyboard(courses):
     keyboard = []
     for course in courses:
         keyboard.append([InlineKeyboardButton(
             f"📘 {course.name}", 
-            callback_data=f"course_{course.id}"
+            callback_data=f"{CB_COURSE}{course.id}"
         )])
     
-    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=CB_MAIN_MENU)])
     
     return InlineKeyboardMarkup(keyboard)
 
@@ -45,14 +138,14 @@ def get_lessons_keyboard(lessons, available_lessons=None):
         else:
             status_emoji = "🔓" if is_available else "🔒"
             
-        callback_data = f"lesson_{lesson.id}" if is_available else "lesson_locked"
+        callback_data = f"{CB_LESSON}{lesson.id}" if is_available else CB_LESSON_LOCKED
         
         keyboard.append([InlineKeyboardButton(
             f"{status_emoji} {lesson.title}", 
             callback_data=callback_data
         )])
     
-    keyboard.append([InlineKeyboardButton("🔙 К темам", callback_data="back_to_courses")])
+    keyboard.append([InlineKeyboardButton("🔙 К темам", callback_data=CB_COURSES)])
     
     return InlineKeyboardMarkup(keyboard)
 
@@ -80,50 +173,118 @@ def get_available_lessons_keyboard(available_lessons_data):
         if current_course_id != course.id:
             keyboard.append([InlineKeyboardButton(
                 f"📘 {course.name}", 
-                callback_data=f"course_info_{course.id}"
+                callback_data=f"{CB_COURSE_INFO}{course.id}"
             )])
             current_course_id = course.id
         
         # Определяем callback_data
         if progress and progress.is_completed:
-            callback_data = f"lesson_{lesson.id}"  # Можно повторить пройденный урок
+            callback_data = f"{CB_LESSON}{lesson.id}"  # Можно повторить пройденный урок
         elif is_available:
-            callback_data = f"lesson_{lesson.id}"
+            callback_data = f"{CB_LESSON}{lesson.id}"
         else:
-            callback_data = "lesson_locked"
+            callback_data = CB_LESSON_LOCKED
         
         keyboard.append([InlineKeyboardButton(
             f"{status_emoji} {lesson.title}", 
             callback_data=callback_data
         )])
     
-    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=CB_MAIN_MENU)])
     
     return InlineKeyboardMarkup(keyboard)
 
+# Буквы вариантов ответа и значки сложности вопросов
+ANSWER_LETTERS = ('A', 'B', 'C', 'D', 'E', 'F')
+DIFFICULTY_ICONS = {
+    "легкий": "⭐",
+    "средний": "⭐⭐",
+    "сложный": "⭐⭐⭐"
+}
+
 # Клавиатуры для вопросов
 def get_question_options_keyboard(question):
     """Создает клавиатуру с вариантами ответов на вопрос."""
-    import json
-    
+    options = question.options_list
+    return get_answer_keyboard(question.id, len(options))
+
+# Клавиатура ответа зависит только от вопроса и числа вариантов, поэтому
+# создается один раз на вопрос
+@functools.lru_cache(maxsize=4096)
+def get_answer_keyboard(question_id, options_count, label_prefix=""):
+    """Создает клавиатуру с буквами вариантов ответа (A, B, C...) на вопрос."""
     keyboard = []
-    options = json.loads(question.options)
-    
-    for i, option in enumerate(options):
+    for i in range(options_count):
         letter = chr(65 + i)  # A, B, C, D...
         
         keyboard.append([InlineKeyboardButton(
-            letter, 
-            callback_data=f"answer_{question.id}_{letter}"
+            f"{label_prefix}{letter}",
+            callback_data=f"{CB_ANSWER}{question_id}{letter}"
         )])
     
     return InlineKeyboardMarkup(keyboard)
 
 # Клавиатура для начала теста
+@functools.lru_cache(maxsize=512)
 def get_start_test_keyboard(lesson_id):
     """Создает клавиатуру для начала тестирования."""
     keyboard = [
-        [InlineKeyboardButton("✅ Начать тест", callback_data=f"start_test_{lesson_id}")]
+        [InlineKeyboardButton("✅ Начать тест", callback_data=f"{CB_START_TEST}{lesson_id}")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+# Клавиатура действий после урока
+@functools.lru_cache(maxsize=512)
+def get_lesson_actions_keyboard(lesson_id, course_id):
+    """Создает клавиатуру с действиями после прочтения урока."""
+    keyboard = [
+        [InlineKeyboardButton("✅ Начать тест", callback_data=f"{CB_START_TEST}{lesson_id}")],
+        [InlineKeyboardButton("❓ Задать вопрос по уроку", callback_data=f"{CB_ASK_QUESTION}{lesson_id}")],
+        [InlineKeyboardButton("📋 К урокам", callback_data=f"{CB_COURSE}{course_id}")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+# Клавиатура результатов теста
+@functools.lru_cache(maxsize=512)
+def get_test_results_keyboard(lesson_id, course_id, next_lesson_id=None):
+    """Создает клавиатуру действий после теста (next_lesson_id - если урок пройден и есть следующий)."""
+    keyboard = [
+        [InlineKeyboardButton("🔄 Пройти урок заново", callback_data=f"{CB_LESSON}{lesson_id}")],
+        [InlineKeyboardButton("📋 К списку уроков", callback_data=f"{CB_COURSE}{course_id}")],
+        [InlineKeyboardButton("🏠 Главное меню", callback_data=CB_MAIN_MENU)]
+    ]
+    if next_lesson_id is not None:
+        keyboard.insert(0, [InlineKeyboardButton("▶️ Следующий урок", callback_data=f"{CB_LESSON}{next_lesson_id}")])
+    return InlineKeyboardMarkup(keyboard)
+
+# Кнопка перехода к следующему вопросу теста (показывается после каждого ответа)
+@functools.lru_cache(maxsize=1)
+def get_next_question_keyboard():
+    """Создает клавиатуру с кнопкой перехода к следующему вопросу."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton("▶️ Продолжить", callback_data=CB_NEXT_QUESTION)]])
+
+# Одиночные кнопки возврата (разметка неизменяема, поэтому создается один раз)
+@functools.lru_cache(maxsize=1)
+def get_back_to_menu_keyboard():
+    """Создает клавиатуру с кнопкой возврата в главное меню."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Главное меню", callback_data=CB_MAIN_MENU)]])
+
+@functools.lru_cache(maxsize=1)
+def get_back_to_courses_keyboard():
+    """Создает клавиатуру с кнопкой возврата к темам."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🔙 К темам", callback_data=CB_COURSES)]])
+
+@functools.lru_cache(maxsize=512)
+def get_back_to_lesson_keyboard(lesson_id, text="🔙 К уроку"):
+    """Создает клавиатуру с кнопкой возврата к уроку."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(text, callback_data=f"{CB_LESSON}{lesson_id}")]])
+
+@functools.lru_cache(maxsize=1)
+def get_no_progress_keyboard():
+    """Создает клавиатуру для пользователя, еще не начавшего обучение."""
+    keyboard = [
+        [InlineKeyboardButton("📚 Начать обучение", callback_data=f"{CB_COURSE}1")],
+        [InlineKeyboardButton("🏠 Главное меню", callback_data=CB_MAIN_MENU)]
     ]
     return InlineKeyboardMarkup(keyboard)
 
@@ -135,11 +296,11 @@ def get_continue_keyboard(next_lesson_id=None):
     if next_lesson_id:
         keyboard.append([InlineKeyboardButton(
             "▶️ Продолжить обучение", 
-            callback_data=f"lesson_{next_lesson_id}"
+            callback_data=f"{CB_LESSON}{next_lesson_id}"
         )])
     
-    keyboard.append([InlineKeyboardButton("📊 Мой прогресс", callback_data="progress")])
-    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="back_to_main")])
+    keyboard.append([InlineKeyboardButton("📊 Мой прогресс", callback_data=CB_PROGRESS)])
+    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data=CB_MAIN_MENU)])
     
     return InlineKeyboardMarkup(keyboard)
 
@@ -147,14 +308,27 @@ def get_continue_keyboard(next_lesson_id=None):
 def get_wrong_answer_keyboard(question_id, lesson_id):
     """Создает клавиатуру с кнопками для неправильного ответа."""
     keyboard = [
-        [InlineKeyboardButton("🔄 Попробовать еще раз", callback_data=f"retry_question_{question_id}")],
-        [InlineKeyboardButton("▶️ Следующий вопрос", callback_data=f"next_question_{lesson_id}")]
+        [InlineKeyboardButton("🔄 Попробовать еще раз", callback_data=f"{CB_RETRY_QUESTION}{question_id}")],
+        [InlineKeyboardButton("▶️ Следующий вопрос", callback_data=f"{CB_NEXT_IN_LESSON}{lesson_id}")]
     ]
     return InlineKeyboardMarkup(keyboard)
 
-# Прогресс-бар
-def get_progress_bar(percentage, width=10):
+# Экранирование названий, вопросов и вариантов ответа для parse_mode="Markdown".
+# Одни и те же тексты показываются всем пользователям, поэтому результат кэшируется
+@functools.lru_cache(maxsize=4096)
+def escape_md(text) -> str:
+    """Экранирует спецсимволы Markdown (_ * ` [) в динамическом тексте сообщения."""
+    return escape_markdown(str(text), version=1)
+
+# Прогресс-бар: полосы стандартной ширины заготовлены для каждого числа заполненных делений
+PROGRESS_BAR_WIDTH = 10
+_PROGRESS_BARS = tuple(
+    "■" * filled + "□" * (PROGRESS_BAR_WIDTH - filled) for filled in range(PROGRESS_BAR_WIDTH + 1)
+)
+
+def get_progress_bar(percentage, width=PROGRESS_BAR_WIDTH):
     """Создает текстовый прогресс-бар."""
-    filled = int(width * percentage / 100)
-    bar = "■" * filled + "□" * (width - filled)
+    # Значения вне 0-100% не должны ломать ширину полосы
+    filled = min(max(int(width * percentage / 100), 0), width)
+    bar = _PROGRESS_BARS[filled] if width == PROGRESS_BAR_WIDTH else "■" * filled + "□" * (width - filled)
     return f"{bar} {percentage:.1f}%"
\ No newline at end of file
@@ -56,6 +56,9 @@ STICKERS = {
 # Модель для RAG и генерации вопросов
 LLM_MODEL_PATH = os.getenv("LLM_MODEL_PATH", "http://localhost:1234/v1")
 
+# Сколько обновлений обрабатывается одновременно (ограничено пулом соединений БД)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "32"))
+
 # Команды для запуска бота
 START_COMMANDS = ["старт", "start", "начать", "начнем", "запуск", "/start"]
 
@@ -18,8 +18,8 @@ from app.langchain.enhanced_agents import (
     coordinate_user_learning
 )
 from app.database.models import get_db
+from app.database.cache import cached_user_id_by_profile
 from app.database.operations import (
-    get_or_create_user,
     get_lesson_by_id,
     get_course,
     update_user_progress,
@@ -97,13 +97,13 @@ class EnhancedLearningSystem:
         try:
             db = get_db()
             
-            # Получаем пользователя
-            user = get_or_create_user(
-                db,
-                telegram_id=telegram_user_data.get('id', user_id),
-                username=telegram_user_data.get('username'),
-                first_name=telegram_user_data.get('first_name'),
-                last_name=telegram_user_data.get('last_name')
+            # ID пользователя из кэша (запрос к БД только для нового пользователя или нового профиля)
+            telegram_user_data = telegram_user_data or {}
+            db_user_id = await cached_user_id_by_profile(
+                telegram_user_data.get('id', user_id),
+                telegram_user_data.get('username'),
+                telegram_user_data.get('first_name'),
+                telegram_user_data.get('last_name')
             )
             
             # Получаем урок и тему
@@ -115,14 +115,14 @@ class EnhancedLearningSystem:
             topic = course.name.lower().replace(" ", "_") if course else "general"
             
             # Создаем профиль пользователя
-            user_profile = await question_generator.generate_user_profile(user.id)
+            user_profile = await question_generator.generate_user_profile(db_user_id)
             
             # Определяем режим обучения
             learning_mode = self._determine_learning_mode(user_profile)
             
             # Создаем сессию
             session = LearningSession(
-                user_id=user.id,
+                user_id=db_user_id,
                 lesson_id=lesson_id,
                 topic=topic,
                 mode=learning_mode,
@@ -133,9 +133,9 @@ class EnhancedLearningSystem:
             await self._generate_session_questions(session)
             
             # Сохраняем активную сессию
-            self.active_sessions[user.id] = session
+            self.active_sessions[db_user_id] = session
             
-            logger.info(f"Запущена сессия обучения для пользователя {user.id}, урок {lesson_id}")
+            logger.info(f"Запущена сессия обучения для пользователя {db_user_id}, урок {lesson_id}")
             return session
             
         except Exception as e:
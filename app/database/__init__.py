@@ -18,11 +18,17 @@ from .models import (
     SessionLocal
 )
 
+# Асинхронный доступ для обработчиков бота
+from .pool import run_db, init_pool, close_pool, with_db
+
 # Импортируем операции
 from .operations import (
     get_or_create_user,
+    touch_user,
+    touch_users,
     get_user_progress,
     update_user_progress,
+    record_test_result,
     save_user_answer,
     get_all_lessons,
     get_lesson_by_id,
@@ -81,16 +87,23 @@ __all__ = [
     'test_connection',
     'engine',
     'SessionLocal',
+    'run_db',
+    'init_pool',
+    'close_pool',
+    'with_db',
     
     # Операции с пользователями
     'get_or_create_user',
     'create_user',  # алиас
+    'touch_user',
+    'touch_users',
     'get_user_by_telegram_id',
     'get_user_statistics',
     
     # Операции с прогрессом
     'get_user_progress',
     'update_user_progress',
+    'record_test_result',
     'create_user_progress',  # алиас
     'get_or_create_user_progress',  # алиас
     
@@ -0,0 +1,185 @@
+"""
+Кэш справочных данных (темы, уроки и вопросы) для обработчиков бота.
+Учебные материалы меняются только при инициализации, поэтому их можно держать в памяти.
+"""
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .operations import (
+    get_all_courses,
+    get_course,
+    get_lesson,
+    get_lessons_by_course,
+    get_course_lessons_with_progress,
+    get_user_progress_map,
+    get_question_by_id,
+    get_questions_by_ids,
+    touch_user
+)
+from .pool import run_db
+
+logger = logging.getLogger(__name__)
+
+# Время жизни записи в кэше (секунды)
+CACHE_TTL = 600
+
+_course_cache: Dict[int, Tuple[float, Any]] = {}
+_lesson_cache: Dict[int, Tuple[float, Any]] = {}
+_course_lessons_cache: Dict[int, Tuple[float, List[Any]]] = {}
+_question_cache: Dict[int, Tuple[float, Any]] = {}
+_courses_list: Optional[Tuple[float, List[Any]]] = None
+
+# Пользователи: telegram_id -> (время записи, ID в БД, (username, first_name, last_name))
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 3600
+_user_cache: "OrderedDict[int, Tuple[float, int, tuple]]" = OrderedDict()
+
+
+def _fresh(entry: Optional[Tuple[float, Any]]) -> bool:
+    return entry is not None and time.monotonic() - entry[0] < CACHE_TTL
+
+
+async def cached_get_all_courses() -> List[Any]:
+    """Возвращает список тем из кэша или из базы данных."""
+    global _courses_list
+    if not _fresh(_courses_list):
+        _courses_list = (time.monotonic(), await run_db(get_all_courses))
+    return _courses_list[1]
+
+
+async def cached_get_course(course_id: int) -> Optional[Any]:
+    """Возвращает тему по ID из кэша или из базы данных."""
+    entry = _course_cache.get(course_id)
+    if not _fresh(entry):
+        course = await run_db(get_course, course_id)
+        if course is None:
+            return None
+        entry = _course_cache[course_id] = (time.monotonic(), course)
+    return entry[1]
+
+
+async def cached_get_lesson(lesson_id: int) -> Optional[Any]:
+    """Возвращает урок по ID из кэша или из базы данных."""
+    entry = _lesson_cache.get(lesson_id)
+    if not _fresh(entry):
+        lesson = await run_db(get_lesson, lesson_id)
+        if lesson is None:
+            return None
+        entry = _lesson_cache[lesson_id] = (time.monotonic(), lesson)
+    return entry[1]
+
+
+async def cached_get_lessons_by_course(course_id: int) -> List[Any]:
+    """Возвращает уроки темы из кэша или из базы данных."""
+    entry = _course_lessons_cache.get(course_id)
+    if not _fresh(entry):
+        lessons = await run_db(get_lessons_by_course, course_id)
+        if not lessons:
+            # Пустой список не кэшируем: уроки могут появиться после инициализации
+            return lessons
+        _remember_course_lessons(course_id, lessons)
+        return lessons
+    return entry[1]
+
+
+def _remember_course_lessons(course_id: int, lessons: List[Any]) -> None:
+    now = time.monotonic()
+    _course_lessons_cache[course_id] = (now, lessons)
+    for lesson in lessons:
+        _lesson_cache[lesson.id] = (now, lesson)
+
+
+async def cached_get_course_lessons_with_progress(course_id: int, user_id: int) -> Tuple[List[Any], Dict[int, Any]]:
+    """Возвращает уроки темы и прогресс пользователя по ним (lesson_id -> прогресс) одним запросом.
+    
+    Уроки из кэша дополняются только прогрессом; при промахе уроки и прогресс выбираются одним JOIN.
+    """
+    entry = _course_lessons_cache.get(course_id)
+    if _fresh(entry):
+        lessons = entry[1]
+        return lessons, await run_db(get_user_progress_map, user_id, [lesson.id for lesson in lessons])
+    
+    rows = await run_db(get_course_lessons_with_progress, course_id, user_id)
+    lessons: List[Any] = []
+    progress_map: Dict[int, Any] = {}
+    for lesson, progress in rows:
+        lessons.append(lesson)
+        if progress is not None:
+            progress_map[lesson.id] = progress
+    if lessons:
+        # Пустой список не кэшируем: уроки могут появиться после инициализации
+        _remember_course_lessons(course_id, lessons)
+    return lessons, progress_map
+
+
+async def cached_get_question(question_id: int) -> Optional[Any]:
+    """Возвращает вопрос по ID из кэша или из базы данных."""
+    entry = _question_cache.get(question_id)
+    if not _fresh(entry):
+        question = await run_db(get_question_by_id, question_id)
+        if question is None:
+            return None
+        entry = _question_cache[question_id] = (time.monotonic(), question)
+    return entry[1]
+
+
+def remember_questions(questions: List[Any]) -> None:
+    """Кладет в кэш уже загруженные вопросы (объекты сессии run_db)."""
+    now = time.monotonic()
+    for question in questions:
+        _question_cache[question.id] = (now, question)
+
+
+async def prefetch_questions(question_ids: List[int]) -> Dict[int, Any]:
+    """Загружает в кэш отсутствующие вопросы одним запросом; возвращает вопросы по ID."""
+    missing = [question_id for question_id in question_ids if not _fresh(_question_cache.get(question_id))]
+    if missing:
+        remember_questions(await run_db(get_questions_by_ids, missing))
+    return {
+        question_id: _question_cache[question_id][1]
+        for question_id in question_ids
+        if question_id in _question_cache
+    }
+
+
+async def cached_user_id(user) -> int:
+    """Возвращает ID пользователя Telegram в БД; запрос выполняется только при промахе или смене профиля.
+    
+    Активность не записывает - ее для каждого обновления пакетно отмечает handlers._track_activity.
+    """
+    return await cached_user_id_by_profile(user.id, user.username, user.first_name, user.last_name)
+
+
+async def cached_user_id_by_profile(telegram_id: int, username: str = None, first_name: str = None, last_name: str = None) -> int:
+    """То же, что cached_user_id, для данных пользователя без объекта Telegram."""
+    profile = (username, first_name, last_name)
+    entry = _user_cache.get(telegram_id)
+    if entry is not None and entry[2] == profile and time.monotonic() - entry[0] < USER_CACHE_TTL:
+        _user_cache.move_to_end(telegram_id)
+        return entry[1]
+    
+    db_user = await run_db(
+        touch_user,
+        telegram_id=telegram_id,
+        username=username,
+        first_name=first_name,
+        last_name=last_name
+    )
+    _user_cache[telegram_id] = (time.monotonic(), db_user.id, profile)
+    _user_cache.move_to_end(telegram_id)
+    if len(_user_cache) > USER_CACHE_SIZE:
+        _user_cache.popitem(last=False)
+    return db_user.id
+
+
+def invalidate_cache() -> None:
+    """Сбрасывает кэш тем, уроков и вопросов (после изменения учебных материалов)."""
+    global _courses_list
+    _course_cache.clear()
+    _lesson_cache.clear()
+    _course_lessons_cache.clear()
+    _question_cache.clear()
+    _courses_list = None
+    logger.info("Кэш тем, уроков и вопросов сброшен")
@@ -3,13 +3,19 @@
 Исправленная версия с полной структурой.
 """
 import os
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
+from typing import Iterator, Optional
 from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker, Session
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.sql import func
 import logging
 
+from app.utils import fast_json
+
 logger = logging.getLogger(__name__)
 
 # Создаем базовый класс
@@ -84,6 +90,15 @@ class Question(Base):
     # Связи
     lesson = relationship("Lesson", back_populates="questions")
     answers = relationship("UserAnswer", back_populates="question")
+    
+    @property
+    def options_list(self) -> list:
+        """Варианты ответа списком; разбираются один раз на объект (вопросы живут в кэше)."""
+        options = self.options
+        cached = self.__dict__.get("_options_list")
+        if cached is None or cached[0] is not options:
+            cached = self.__dict__["_options_list"] = (options, fast_json.parse_options(options))
+        return cached[1]
 
 class UserProgress(Base):
     """Модель прогресса пользователя по урокам."""
@@ -128,11 +143,41 @@ except ImportError:
     # Запасной вариант если импорт не удался
     DATABASE_URL_IMPORT = os.getenv("DATABASE_URL", "sqlite:///risk_training.db")
 
+# Размер пула соединений: потоки run_db и сессии обработчиков работают одновременно
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+
+# JSON-колонки (варианты ответов) (де)сериализуются через orjson, если он установлен
+_JSON_ENGINE_ARGS = {"json_serializer": fast_json.dumps, "json_deserializer": fast_json.loads}
+
 # Создаем движок базы данных
-engine = create_engine(
-    DATABASE_URL_IMPORT,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL_IMPORT else {}
-)
+if "sqlite" in DATABASE_URL_IMPORT:
+    if ":memory:" in DATABASE_URL_IMPORT or DATABASE_URL_IMPORT.rstrip("/") == "sqlite:":
+        # БД в памяти существует только внутри одного соединения - делим его между потоками
+        engine = create_engine(
+            DATABASE_URL_IMPORT,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+            **_JSON_ENGINE_ARGS
+        )
+    else:
+        # Файловая SQLite: пул не меньше числа потоков, обращающихся к БД
+        engine = create_engine(
+            DATABASE_URL_IMPORT,
+            connect_args={"check_same_thread": False},
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            **_JSON_ENGINE_ARGS
+        )
+else:
+    engine = create_engine(
+        DATABASE_URL_IMPORT,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        **_JSON_ENGINE_ARGS
+    )
 
 # Создаем фабрику сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -252,8 +297,14 @@ def init_db():
         logger.error(f"Ошибка при инициализации базы данных: {e}")
         raise
 
+# Сессия текущего обновления Telegram (открывается декоратором with_db из app.database.pool)
+current_session: ContextVar[Optional[Session]] = ContextVar("current_db_session", default=None)
+
 def get_db() -> Session:
-    """Получает сессию базы данных."""
+    """Получает сессию базы данных (внутри обработчика - общую сессию текущего обновления)."""
+    db = current_session.get()
+    if db is not None:
+        return db
     db = SessionLocal()
     try:
         return db
@@ -262,6 +313,25 @@ def get_db() -> Session:
         db.close()
         raise
 
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """Одна сессия на блок кода: вложенные get_db() используют ее, по выходу она закрывается."""
+    db = current_session.get()
+    if db is not None:
+        # Уже внутри области сессии (например, обработчика) - используем ее
+        yield db
+        return
+    db = SessionLocal()
+    token = current_session.set(db)
+    try:
+        yield db
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        current_session.reset(token)
+        db.close()
+
 def close_db(db: Session):
     """Закрывает сессию базы данных."""
     try:
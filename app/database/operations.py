@@ -2,9 +2,9 @@
 Операции для работы с базой данных.
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func, and_, distinct, case, update
 from sqlalchemy.orm import sessionmaker
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
 import logging
 from datetime import datetime
 
@@ -61,6 +61,102 @@ def update_user_activity(db: Session, user_id: int):
         db.rollback()
         return None
 
+def _user_upsert_insert(db: Session):
+    """Возвращает insert() с поддержкой ON CONFLICT для текущей СУБД или None."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(User)
+
+def _user_upsert_stmt(insert_stmt, last_activity=None):
+    """Добавляет к INSERT пользователей обновление данных и активности при конфликте.
+    
+    last_activity - SQL-выражение для времени активности (по умолчанию текущее время СУБД).
+    """
+    excluded = insert_stmt.excluded
+    return insert_stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={
+            "username": func.coalesce(excluded.username, User.username),
+            "first_name": func.coalesce(excluded.first_name, User.first_name),
+            "last_name": func.coalesce(excluded.last_name, User.last_name),
+            "last_activity": func.now() if last_activity is None else last_activity
+        }
+    )
+
+def touch_user(db: Session, telegram_id: int, username: str = None, first_name: str = None, last_name: str = None) -> User:
+    """Создает пользователя или обновляет его данные и активность одним запросом (UPSERT)."""
+    insert_stmt = _user_upsert_insert(db)
+    if insert_stmt is None:
+        # Для прочих СУБД UPSERT не поддерживается - две операции
+        user = get_or_create_user(db, telegram_id, username, first_name, last_name)
+        update_user_activity(db, user.id)
+        return user
+    
+    try:
+        stmt = _user_upsert_stmt(insert_stmt.values(
+            telegram_id=telegram_id,
+            username=username,
+            first_name=first_name,
+            last_name=last_name
+        )).returning(User)
+        user = db.scalars(stmt, execution_options={"populate_existing": True}).one()
+        db.commit()
+        return user
+    except Exception as e:
+        logger.error(f"Ошибка при работе с пользователем {telegram_id}: {e}")
+        db.rollback()
+        raise
+
+def touch_users(db: Session, users: Dict[int, tuple]) -> int:
+    """Пакетно обновляет активность пользователей.
+    
+    users: {telegram_id: (username, first_name, last_name[, last_activity])}; без времени
+    активности используется время записи.
+    """
+    if not users:
+        return 0
+    now = datetime.utcnow()
+    rows = [
+        {
+            "telegram_id": telegram_id,
+            "username": profile[0],
+            "first_name": profile[1],
+            "last_name": profile[2],
+            "last_activity": profile[3] if len(profile) > 3 else now
+        }
+        for telegram_id, profile in users.items()
+    ]
+    
+    try:
+        insert_stmt = _user_upsert_insert(db)
+        if insert_stmt is None:
+            # Для прочих СУБД UPSERT не поддерживается: профили обновляются по одному,
+            # а время активности - одним UPDATE ... CASE для всего пакета
+            for row in rows:
+                get_or_create_user(db, row["telegram_id"], row["username"], row["first_name"], row["last_name"])
+            db.execute(
+                update(User)
+                .where(User.telegram_id.in_(users.keys()))
+                .values(last_activity=case(
+                    {row["telegram_id"]: row["last_activity"] for row in rows},
+                    value=User.telegram_id
+                ))
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            db.execute(_user_upsert_stmt(insert_stmt, insert_stmt.excluded.last_activity), rows)
+        db.commit()
+        return len(rows)
+    except Exception as e:
+        logger.error(f"Ошибка при пакетном обновлении активности {len(users)} пользователей: {e}")
+        db.rollback()
+        return 0
+
 def get_all_courses(db: Session):
     """Получает все курсы (заглушка для совместимости)."""
     # В упрощенной версии возвращаем список с одним курсом
@@ -103,51 +199,88 @@ def get_next_lesson(db: Session, current_lesson_id: int):
         logger.error(f"Ошибка при получении следующего урока после {current_lesson_id}: {e}")
         return None
 
+class _DefaultCourse:
+    """Тема-заглушка для уроков (в упрощенной версии тема одна)."""
+    id = 1
+    name = "Риски непрерывности деятельности"
+
+def _available_lessons_data(lessons: List[Lesson], progress_map: Dict[int, UserProgress]):
+    """Собирает данные о доступности уроков с прогрессом пользователя."""
+    course = _DefaultCourse()
+    
+    return [
+        {
+            "lesson": lesson,
+            "course": course,
+            "progress": progress_map.get(lesson.id),
+            "is_available": True  # Упрощенная логика - все уроки доступны
+        }
+        for lesson in lessons
+    ]
+
 def get_available_lessons(db: Session, user_id: int):
     """Получает список доступных уроков для пользователя."""
     try:
         lessons = get_all_lessons(db)
-        available_lessons = []
-        
-        for lesson in lessons:
-            progress = get_user_progress(db, user_id, lesson.id)
-            is_available = True  # Упрощенная логика - все уроки доступны
-            
-            # Создаем курс-заглушку
-            class Course:
-                def __init__(self):
-                    self.id = 1
-                    self.name = "Риски непрерывности деятельности"
-            
-            available_lessons.append({
-                "lesson": lesson,
-                "course": Course(),
-                "progress": progress,
-                "is_available": is_available
-            })
-        
-        return available_lessons
+        # Прогресс по всем урокам одним запросом вместо запроса на каждый урок
+        progress_map = get_user_progress_map(db, user_id, [lesson.id for lesson in lessons])
+        return _available_lessons_data(lessons, progress_map)
     except Exception as e:
         logger.error(f"Ошибка при получении доступных уроков для пользователя {user_id}: {e}")
         return []
 
-def get_course_progress(db: Session, user_id: int, course_id: int) -> float:
-    """Получает прогресс пользователя по курсу."""
+def get_course_lessons_with_progress(db: Session, course_id: int, user_id: int) -> List[Tuple[Lesson, Optional[UserProgress]]]:
+    """Получает уроки темы вместе с прогрессом пользователя одним запросом (LEFT JOIN)."""
+    return db.query(Lesson, UserProgress).outerjoin(
+        UserProgress,
+        and_(UserProgress.lesson_id == Lesson.id, UserProgress.user_id == user_id)
+    ).filter(Lesson.course_id == course_id).order_by(Lesson.order).all()
+
+def get_available_lessons_for_course(db: Session, user_id: int, course_id: int):
+    """Получает список доступных уроков одной темы для пользователя."""
     try:
-        lessons = get_lessons_by_course(db, course_id)
-        if not lessons:
-            return 0.0
-        
-        completed_lessons = 0
-        for lesson in lessons:
-            progress = get_user_progress(db, user_id, lesson.id)
-            if progress and progress.is_completed:
-                completed_lessons += 1
+        rows = get_course_lessons_with_progress(db, course_id, user_id)
         
-        return (completed_lessons / len(lessons)) * 100.0
+        lessons: Dict[int, Lesson] = {}
+        progress_map: Dict[int, UserProgress] = {}
+        for lesson, progress in rows:
+            lessons.setdefault(lesson.id, lesson)
+            if progress is not None:
+                progress_map[lesson.id] = progress
+        return _available_lessons_data(list(lessons.values()), progress_map)
     except Exception as e:
-        logger.error(f"Ошибка при получении прогресса курса {course_id} для пользователя {user_id}: {e}")
-        return 0.0
+        logger.error(f"Ошибка при получении доступных уроков темы {course_id} для пользователя {user_id}: {e}")
+        return []
+
+def get_courses_progress(db: Session, user_id: int, course_ids: Optional[List[int]] = None) -> Dict[int, float]:
+    """Получает процент пройденных уроков по темам одним агрегирующим запросом."""
+    try:
+        query = db.query(
+            Lesson.course_id,
+            func.count(distinct(Lesson.id)),
+            func.count(distinct(UserProgress.lesson_id))
+        ).outerjoin(
+            UserProgress,
+            and_(
+                UserProgress.lesson_id == Lesson.id,
+                UserProgress.user_id == user_id,
+                UserProgress.is_completed.is_(True)
+            )
+        )
+        if course_ids is not None:
+            query = query.filter(Lesson.course_id.in_(course_ids))
+        return {
+            course_id: (completed / total) * 100.0
+            for course_id, total, completed in query.group_by(Lesson.course_id).all()
+            if total
+        }
+    except Exception as e:
+        logger.error(f"Ошибка при получении прогресса по темам для пользователя {user_id}: {e}")
+        return {}
+
+def get_course_progress(db: Session, user_id: int, course_id: int) -> float:
+    """Получает прогресс пользователя по курсу."""
+    return get_courses_progress(db, user_id, [course_id]).get(course_id, 0.0)
 
 def get_or_create_user_progress(db: Session, user_id: int, lesson_id: int) -> UserProgress:
     """Получает существующий прогресс или создает новый."""
@@ -282,6 +415,20 @@ def get_user_progress(db: Session, user_id: int, lesson_id: int) -> Optional[Use
         logger.error(f"Ошибка при получении прогресса пользователя {user_id}, урок {lesson_id}: {e}")
         return None
 
+def get_user_progress_map(db: Session, user_id: int, lesson_ids: List[int]) -> Dict[int, UserProgress]:
+    """Получает прогресс пользователя сразу по нескольким урокам одним запросом."""
+    if not lesson_ids:
+        return {}
+    try:
+        rows = db.query(UserProgress).filter(
+            UserProgress.user_id == user_id,
+            UserProgress.lesson_id.in_(lesson_ids)
+        ).all()
+        return {progress.lesson_id: progress for progress in rows}
+    except Exception as e:
+        logger.error(f"Ошибка при получении прогресса пользователя {user_id} по урокам {lesson_ids}: {e}")
+        return {}
+
 def update_user_progress(
     db: Session,
     user_id: int,
@@ -325,6 +472,19 @@ def update_user_progress(
         db.rollback()
         raise
 
+def record_test_result(
+    db: Session,
+    user_id: int,
+    lesson_id: int,
+    is_completed: bool,
+    success_percentage: float
+) -> Optional[Lesson]:
+    """Сохраняет результат теста и возвращает следующий урок (одна транзакция, один commit)."""
+    # Чтение выполняется в той же транзакции, которую фиксирует update_user_progress
+    next_lesson = get_next_lesson(db, lesson_id)
+    update_user_progress(db, user_id, lesson_id, is_completed, success_percentage)
+    return next_lesson
+
 def save_user_answer(
     db: Session,
     user_id: int,
@@ -388,6 +548,16 @@ def get_question_by_id(db: Session, question_id: int) -> Optional[Question]:
         logger.error(f"Ошибка при получении вопроса {question_id}: {e}")
         return None
 
+def get_questions_by_ids(db: Session, question_ids: List[int]) -> List[Question]:
+    """Получает несколько вопросов по ID одним запросом."""
+    if not question_ids:
+        return []
+    try:
+        return db.query(Question).filter(Question.id.in_(question_ids)).all()
+    except Exception as e:
+        logger.error(f"Ошибка при получении вопросов {question_ids}: {e}")
+        return []
+
 def get_question(db: Session, question_id: int) -> Optional[Question]:
     """Алиас для get_question_by_id для совместимости."""
     return get_question_by_id(db, question_id)
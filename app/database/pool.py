@@ -0,0 +1,69 @@
+"""
+Асинхронный доступ к базе данных для обработчиков бота.
+Синхронные операции выполняются в пуле потоков, не блокируя цикл событий.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from sqlalchemy.orm import sessionmaker
+
+from .models import engine, DB_POOL_SIZE, SessionLocal, current_session
+
+logger = logging.getLogger(__name__)
+
+# Сессии пула не сбрасывают атрибуты после commit: объекты читаются после закрытия сессии
+PoolSession = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def init_pool() -> ThreadPoolExecutor:
+    """Создает пул потоков для операций с БД (один раз за запуск)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+        logger.info(f"Пул БД инициализирован: {DB_POOL_SIZE} потоков")
+    return _executor
+
+
+def close_pool() -> None:
+    """Останавливает пул потоков и закрывает соединения движка."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    engine.dispose()
+
+
+def _call_in_session(func: Callable, args: tuple, kwargs: dict) -> Any:
+    db = PoolSession()
+    try:
+        return func(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+async def run_db(func: Callable, *args, **kwargs) -> Any:
+    """Выполняет операцию func(db, *args, **kwargs) в отдельной сессии вне цикла событий."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(init_pool(), _call_in_session, func, args, kwargs)
+
+
+def with_db(handler: Callable) -> Callable:
+    """Декоратор обработчика: одна сессия БД на обновление, закрывается по завершении."""
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        if current_session.get() is not None:
+            # Вложенный вызов (например, handle_message -> start) использует уже открытую сессию
+            return await handler(*args, **kwargs)
+        db = SessionLocal()
+        token = current_session.set(db)
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            current_session.reset(token)
+            db.close()
+    return wrapper
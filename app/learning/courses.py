@@ -6,12 +6,12 @@ from sqlalchemy.orm import Session
 
 from app.database.models import Course, Lesson, UserProgress, get_db
 from app.database.operations import (
-    get_lessons_by_course,
-    get_user_progress,
     create_course,
     get_all_courses,
-    get_user_lessons_progress
+    get_user_lessons_progress,
+    get_course_progress as _get_course_progress
 )
+from app.database.cache import invalidate_cache
 
 # Определение тем обучения
 COURSES = [
@@ -69,22 +69,12 @@ def init_courses() -> List[Dict[str, Any]]:
                 description=course_data["description"],
                 order=course_data["order"]
             )
+        invalidate_cache()
     
     # Получаем все темы после инициализации
     return get_all_courses(db)
 
 def get_course_progress(db: Session, user_id: int, course_id: int) -> float:
     """Получает прогресс пользователя по теме."""
-    lessons = get_lessons_by_course(db, course_id)
-    progress_list = []
-    
-    for lesson in lessons:
-        progress = get_user_progress(db, user_id, lesson.id)
-        if progress:
-            progress_list.append(progress)
-    
-    if not lessons or not progress_list:
-        return 0.0
-    
-    completed_lessons = sum(1 for p in progress_list if p.is_completed)
-    return (completed_lessons / len(lessons)) * 100.0
\ No newline at end of file
+    # Подсчет выполняется в базе данных одним запросом
+    return _get_course_progress(db, user_id, course_id)
\ No newline at end of file
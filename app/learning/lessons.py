@@ -4,6 +4,7 @@
 from typing import List, Dict, Any
 from app.database.models import get_db
 from app.database.operations import create_lesson, get_lessons_by_course
+from app.database.cache import invalidate_cache
 
 # Определение уроков по темам
 LESSONS = {
@@ -259,6 +260,7 @@ def init_lessons(course_id: int) -> List[Dict[str, Any]]:
                 content=lesson_data["content"],
                 order=lesson_data["order"]
             )
+        invalidate_cache()
     
     # Получаем все уроки после инициализации
     return get_lessons_by_course(db, course_id)
\ No newline at end of file
@@ -16,6 +16,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 from telegram import Update
 
+from app.utils.log_queue import setup_queue_logging
+
 # Настройка логирования
 def setup_logging(level: str = "INFO"):
     """Настройка системы логирования."""
@@ -39,11 +41,8 @@ def setup_logging(level: str = "INFO"):
     console_handler.setFormatter(formatter)
     console_handler.setLevel(log_level)
     
-    # Настройка корневого логгера
-    logging.basicConfig(
-        level=log_level,
-        handlers=[file_handler, console_handler]
-    )
+    # Настройка корневого логгера: запись в файл и консоль выполняет фоновый поток
+    setup_queue_logging([file_handler, console_handler], log_level)
     
     return logging.getLogger(__name__)
 
@@ -85,8 +84,7 @@ class EnhancedBot:
             return True
             
         except Exception as e:
-            self.logger.error(f"❌ Критическая ошибка инициализации: {e}")
-            self.logger.error(traceback.format_exc())
+            self.logger.exception(f"❌ Критическая ошибка инициализации: {e}")
             return False
     
     async def _check_configuration(self) -> bool:
@@ -184,9 +182,10 @@ class EnhancedBot:
         """Создание Telegram приложения."""
         try:
             from app.config import TELEGRAM_TOKEN
+            from app.bot.handlers import build_application
             
-            # Создаем приложение
-            self.application = Application.builder().token(TELEGRAM_TOKEN).build()
+            # Создаем приложение (параллельная обработка обновлений и ограничитель частоты - как в run_bot)
+            self.application = build_application(TELEGRAM_TOKEN)
             
             # Добавляем обработчик ошибок
             self.application.add_error_handler(self._error_handler)
@@ -218,23 +217,19 @@ class EnhancedBot:
                 
                 self.logger.info("✅ Подключены улучшенные обработчики")
             else:
-                # Используем базовые обработчики
-                from app.bot.handlers import start, handle_message, handle_callback
+                # Используем базовые обработчики (вместе с учетом активности пользователей)
+                from app.bot.handlers import register_handlers
                 
-                self.application.add_handler(CommandHandler("start", start))
-                self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-                self.application.add_handler(CallbackQueryHandler(handle_callback))
+                register_handlers(self.application)
                 
                 self.logger.info("✅ Подключены базовые обработчики")
             
         except ImportError as e:
             self.logger.error(f"❌ Ошибка импорта обработчиков: {e}")
             # Fallback к базовым обработчикам
-            from app.bot.handlers import start, handle_message, handle_callback
+            from app.bot.handlers import register_handlers
             
-            self.application.add_handler(CommandHandler("start", start))
-            self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-            self.application.add_handler(CallbackQueryHandler(handle_callback))
+            register_handlers(self.application)
             
             self.logger.info("✅ Подключены fallback обработчики")
     
@@ -245,8 +240,7 @@ class EnhancedBot:
             
             # Логируем ошибку
             self.logger.error(f"Ошибка при обработке обновления: {update}")
-            self.logger.error(f"Ошибка: {error}")
-            self.logger.error("".join(traceback.format_tb(error.__traceback__)))
+            self.logger.error(f"Ошибка: {error}", exc_info=error)
             
             # Отправляем сообщение пользователю, если возможно
             if update and update.effective_chat:
@@ -280,8 +274,7 @@ class EnhancedBot:
             )
             
         except Exception as e:
-            self.logger.error(f"❌ Критическая ошибка запуска: {e}")
-            self.logger.error(traceback.format_exc())
+            self.logger.exception(f"❌ Критическая ошибка запуска: {e}")
             raise
     
     def _log_system_status(self):
@@ -0,0 +1,35 @@
+"""
+Быстрая (де)сериализация JSON: orjson, если установлен, иначе стандартный json.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    def loads(data):
+        """Разбирает JSON из строки или байтов."""
+        return orjson.loads(data)
+
+    def dumps(obj) -> str:
+        """Сериализует объект в JSON-строку."""
+        return orjson.dumps(obj).decode("utf-8")
+else:
+    loads = json.loads
+
+    def dumps(obj) -> str:
+        """Сериализует объект в JSON-строку."""
+        return json.dumps(obj, ensure_ascii=False)
+
+
+def parse_options(options) -> list:
+    """Возвращает варианты ответа вопроса списком (JSON-строка, строки через перенос или список)."""
+    if not isinstance(options, str):
+        return options
+    try:
+        return loads(options)
+    except ValueError:
+        return [opt.strip() for opt in options.split('\n') if opt.strip()]
@@ -0,0 +1,49 @@
+"""
+Асинхронное логирование: записи кладутся в очередь, а форматирование
+(включая трассировки исключений) и запись в файл/консоль выполняет фоновый поток.
+"""
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+
+_listener: Optional[QueueListener] = None
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке.
+
+    Стандартный prepare() форматирует запись (и трассировку) сразу, в потоке
+    цикла событий; здесь запись передается как есть, а форматируют ее
+    обработчики слушателя. Очередь внутрипроцессная, поэтому сериализация не нужна.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_queue_logging(handlers: List[logging.Handler], level: int = logging.INFO) -> None:
+    """Направляет корневой логгер в очередь, которую разбирает фоновый поток с обработчиками handlers."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_queue_logging)
+
+
+def stop_queue_logging() -> None:
+    """Дописывает оставшиеся в очереди записи и останавливает фоновый поток."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
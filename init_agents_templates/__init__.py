@@ -0,0 +1 @@
+"""Шаблоны модулей, которые генерирует скрипт init_agents.py."""
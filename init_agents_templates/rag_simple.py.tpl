@@ -0,0 +1,134 @@
+"""
+Модуль для работы с RAG (упрощенная версия для локального тестирования).
+Используется для генерации вопросов на основе базы знаний без использования LLM.
+"""
+import json
+import random
+import os
+import functools
+from typing import List, Dict, Any, Tuple
+
+# orjson быстрее стандартного json; если он не установлен, используем json
+try:
+    from orjson import loads as _json_loads, JSONDecodeError
+except ImportError:
+    from json import loads as _json_loads, JSONDecodeError
+
+# Путь к базе знаний
+RISK_KNOWLEDGE_PATH = "app/knowledge/jsonl/risk_knowledge.jsonl"
+
+@functools.lru_cache(maxsize=4)
+def _load_cached(path: str, mtime_ns: int) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Читает базу знаний и краткие ответы; кэшируется по пути и времени изменения файла."""
+    with open(path, 'rb', buffering=1 << 16) as f:
+        knowledge_base = [_json_loads(line) for line in f if line.strip()]
+    
+    # Краткие ответы (первое предложение) для всех элементов базы
+    short_answers = [kb_item['response'].split('.', 1)[0] + '.' for kb_item in knowledge_base]
+    return knowledge_base, short_answers
+
+def _load_with_short_answers(path: str = RISK_KNOWLEDGE_PATH) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Возвращает базу знаний и краткие ответы, перечитывая файл только после его изменения."""
+    try:
+        return _load_cached(path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        print(f"Файл не найден: {path}")
+        return [], []
+    except JSONDecodeError:
+        print(f"Ошибка декодирования JSON в файле: {path}")
+        return [], []
+
+def load_knowledge_base(path: str = RISK_KNOWLEDGE_PATH) -> List[Dict[str, Any]]:
+    """Загружает базу знаний из JSONL файла."""
+    return list(_load_with_short_answers(path)[0])
+
+def generate_questions(
+    topic: str, 
+    difficulty: str = "средний", 
+    num_questions: int = 3
+) -> List[Dict[str, Any]]:
+    """Генерирует вопросы из базы знаний."""
+    # Загружаем базу знаний вместе с заранее посчитанными краткими ответами
+    knowledge_base, short_cache = _load_with_short_answers()
+    if not knowledge_base:
+        print("Ошибка: база знаний пуста")
+        return []
+    
+    # Фильтруем базу знаний по теме и сложности (храним индексы элементов)
+    topic_prefix = topic.split('_')[0]
+    eligible_idx = [
+        kb_index for kb_index, item in enumerate(knowledge_base)
+        if (
+            item.get('metadata', {}).get('topic', '').startswith(topic_prefix) and 
+            item.get('metadata', {}).get('difficulty', '') == difficulty
+        )
+    ]
+    
+    # Если не нашли подходящих элементов, используем все элементы базы
+    if not eligible_idx:
+        eligible_idx = list(range(len(knowledge_base)))
+    
+    # Создаем вопросы
+    questions = []
+    
+    # Выбираем случайные элементы без повторений
+    if len(eligible_idx) >= num_questions:
+        chosen = random.sample(eligible_idx, num_questions)
+    else:
+        chosen = list(eligible_idx)
+        chosen_set = set(chosen)
+        remaining = [kb_index for kb_index in range(len(knowledge_base)) if kb_index not in chosen_set]
+        if remaining:
+            chosen.extend(random.sample(remaining, min(num_questions - len(chosen), len(remaining))))
+    
+    # Создаем вопросы на основе выбранных элементов
+    for kb_index in chosen:
+        item = knowledge_base[kb_index]
+        question_text = item['prompt']
+        correct_answer = item['response']
+        
+        # Формируем краткий ответ (первое предложение)
+        short_answer = short_cache[kb_index]
+        
+        # Генерируем неправильные варианты, используя другие ответы из базы
+        other_answers = short_cache[:kb_index] + short_cache[kb_index + 1:]
+        
+        # Выбираем случайные неправильные ответы
+        wrong_answers = random.sample(other_answers, min(3, len(other_answers)))
+        while len(wrong_answers) < 3:
+            wrong_answers.append("Недостаточно информации для ответа")
+        
+        # Формируем варианты ответов
+        options = [short_answer] + wrong_answers
+        random.shuffle(options)
+        
+        # Определяем правильный ответ
+        correct_index = options.index(short_answer)
+        correct_letter = chr(65 + correct_index)  # A, B, C или D
+        
+        question_data = {
+            "question": question_text,
+            "options": options,
+            "correct_answer": correct_letter,
+            "explanation": correct_answer
+        }
+        
+        questions.append(question_data)
+    
+    return questions
+
+def convert_questions_for_db(questions: List[Dict[str, Any]], lesson_id: int) -> List[Dict[str, Any]]:
+    """Преобразует сгенерированные вопросы в формат для сохранения в базе данных."""
+    db_questions = []
+    
+    for question in questions:
+        db_question = {
+            "lesson_id": lesson_id,
+            "text": question["question"],
+            "options": json.dumps(question["options"], ensure_ascii=False),
+            "correct_answer": question["correct_answer"],
+            "explanation": question.get("explanation", "")
+        }
+        db_questions.append(db_question)
+    
+    return db_questions
@@ -14,7 +14,12 @@ from app.bot.keyboards import (
     get_courses_keyboard,
     get_lessons_keyboard,
     get_question_options_keyboard,
-    get_progress_bar
+    get_progress_bar,
+    escape_md,
+    parse_callback_id,
+    parse_callback_answer,
+    CB_LESSON,
+    CB_LESSON_LOCKED
 )
 from app.bot.stickers import (
     send_welcome_sticker,
@@ -22,6 +27,7 @@ from app.bot.stickers import (
     send_wrong_answer_sticker
 )
 from app.database.models import User, Course, Lesson, Question
+from app.utils.fast_json import parse_options
 
 class TestKeyboards(unittest.TestCase):
     """Тесты для функций создания клавиатур."""
@@ -59,10 +65,10 @@ class TestKeyboards(unittest.TestCase):
         self.assertEqual(len(keyboard.inline_keyboard), 3)  # 2 урока + кнопка "К темам"
         
         # Проверяем, что первая кнопка содержит callback_data с id урока
-        self.assertTrue(keyboard.inline_keyboard[0][0].callback_data.startswith("lesson_1"))
+        self.assertEqual(keyboard.inline_keyboard[0][0].callback_data, f"{CB_LESSON}1")
         
-        # Проверяем, что вторая кнопка содержит callback_data "lesson_locked"
-        self.assertEqual(keyboard.inline_keyboard[1][0].callback_data, "lesson_locked")
+        # Проверяем, что вторая кнопка заблокирована
+        self.assertEqual(keyboard.inline_keyboard[1][0].callback_data, CB_LESSON_LOCKED)
     
     def test_question_options_keyboard(self):
         """Тест создания клавиатуры вариантов ответов."""
@@ -98,6 +104,101 @@ class TestKeyboards(unittest.TestCase):
         # Тестируем прогресс 100%
         progress_100 = get_progress_bar(100)
         self.assertEqual(progress_100, "■■■■■■■■■■ 100.0%")
+    
+    def test_progress_bar_bounds(self):
+        """Тест прогресс-бара для значений вне диапазона 0-100%."""
+        self.assertEqual(get_progress_bar(120), "■■■■■■■■■■ 120.0%")
+        self.assertEqual(get_progress_bar(-5), "□□□□□□□□□□ -5.0%")
+        self.assertEqual(get_progress_bar(50, width=4), "■■□□ 50.0%")
+
+    def test_escape_md(self):
+        """Тест экранирования Markdown в динамическом тексте."""
+        self.assertEqual(escape_md("risk_management"), "risk\\_management")
+        self.assertEqual(escape_md("[A] *B*"), "\\[A] \\*B\\*")
+        self.assertEqual(escape_md("Обычный текст"), "Обычный текст")
+
+class TestCallbackDispatch(unittest.TestCase):
+    """Тесты для разбора callback_data и таблиц маршрутизации."""
+    
+    def test_parse_callback_id(self):
+        """Тест разбора коротких и старых форматов "<действие><ID>"."""
+        self.assertEqual(parse_callback_id("l12"), ("l", 12))
+        self.assertEqual(parse_callback_id("ci3"), ("ci", 3))
+        self.assertEqual(parse_callback_id("start_test_7"), ("start_test", 7))
+        self.assertEqual(parse_callback_id("main_menu"), (None, None))
+    
+    def test_parse_callback_answer(self):
+        """Тест разбора ответа на вопрос в коротком и старом формате."""
+        self.assertEqual(parse_callback_answer("a12B"), (12, "B"))
+        self.assertEqual(parse_callback_answer("answer_12_B"), (12, "B"))
+        self.assertEqual(parse_callback_answer("l12"), (None, None))
+    
+    def test_every_button_has_a_route(self):
+        """Тест: для каждого кода кнопки есть обработчик."""
+        from app.bot import keyboards
+        from app.bot.handlers import _EXACT_CALLBACKS, _ID_CALLBACKS
+        
+        for code in (keyboards.CB_MAIN_MENU, keyboards.CB_COURSES, keyboards.CB_PROGRESS, keyboards.CB_NEXT_QUESTION):
+            self.assertIn(code, _EXACT_CALLBACKS)
+        for code in (
+            keyboards.CB_COURSE, keyboards.CB_COURSE_INFO, keyboards.CB_LESSON, keyboards.CB_START_TEST,
+            keyboards.CB_ASK_QUESTION, keyboards.CB_NEXT_IN_LESSON, keyboards.CB_RETRY_QUESTION
+        ):
+            self.assertIn(parse_callback_id(f"{code}1")[0], _ID_CALLBACKS)
+
+class TestActivityBuffer(unittest.TestCase):
+    """Тесты пакетной записи активности пользователей."""
+    
+    def setUp(self):
+        from app.bot import handlers
+        self.handlers = handlers
+        handlers._pending_activity.clear()
+        handlers._activity_job_scheduled = False
+        self.addCleanup(handlers._pending_activity.clear)
+        self.user = MagicMock(id=1, username="user", first_name="First", last_name=None)
+    
+    def test_flush_job_scheduled_lazily(self):
+        """Периодическая запись ставится при первом обновлении, если ее не поставил _post_init."""
+        context = MagicMock()
+        context.job_queue.get_jobs_by_name.return_value = ()
+        
+        self.handlers._mark_activity(context, self.user)
+        self.handlers._mark_activity(context, self.user)
+        
+        context.job_queue.run_repeating.assert_called_once()
+        context.application.create_task.assert_not_called()
+    
+    def test_flush_when_buffer_full(self):
+        """Переполненный буфер записывается, не дожидаясь периода."""
+        context = MagicMock()
+        self.handlers._activity_job_scheduled = True
+        for telegram_id in range(self.handlers.ACTIVITY_FLUSH_MAX_PENDING - 1):
+            self.handlers._pending_activity[telegram_id] = (None, None, None, None)
+        
+        with patch.object(self.handlers, "_flush_activity", MagicMock()):
+            self.handlers._mark_activity(context, MagicMock(id=-1))
+        
+        context.application.create_task.assert_called_once()
+
+class TestQuestionOptions(unittest.TestCase):
+    """Тесты для разбора вариантов ответа."""
+    
+    def test_parse_options(self):
+        """Тест разбора вариантов из JSON, строк и списка."""
+        self.assertEqual(parse_options(json.dumps(["Риск", "Угроза"])), ["Риск", "Угроза"])
+        self.assertEqual(parse_options("Риск\n Угроза \n"), ["Риск", "Угроза"])
+        self.assertEqual(parse_options(["Риск"]), ["Риск"])
+    
+    def test_question_options_list(self):
+        """Тест разбора вариантов ответа один раз на объект вопроса."""
+        question = Question(id=1, lesson_id=1, text="Вопрос?", options=json.dumps(["A", "B"]), correct_answer="A")
+        options = question.options_list
+        self.assertEqual(options, ["A", "B"])
+        self.assertIs(question.options_list, options)
+        
+        # После изменения вариантов список разбирается заново
+        question.options = json.dumps(["C"])
+        self.assertEqual(question.options_list, ["C"])
 
 class TestStickers(unittest.TestCase):
     """Тесты для функций отправки стикеров."""
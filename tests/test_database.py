@@ -4,20 +4,28 @@
 import unittest
 import os
 import tempfile
+from datetime import datetime
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.database.models import Base, User, Course, Lesson, Question, UserProgress, UserAnswer
+from app.database import create_user
 from app.database.operations import (
     get_user_by_telegram_id,
-    create_user,
     get_or_create_user,
+    touch_user,
+    touch_users,
     create_course,
     get_all_courses,
     get_course,
     create_lesson,
     get_lessons_by_course,
     get_lesson,
+    get_courses_progress,
+    get_available_lessons_for_course,
+    get_course_lessons_with_progress,
+    get_user_progress,
+    record_test_result,
     create_question,
     get_questions_by_lesson
 )
@@ -83,6 +91,41 @@ class TestDatabase(unittest.TestCase):
         self.assertNotEqual(new_user.id, user.id)
         self.assertEqual(new_user.telegram_id, 654321)
     
+    def test_touch_user(self):
+        """Тестирование UPSERT пользователя одним запросом."""
+        # Создание нового пользователя
+        user = touch_user(self.session, telegram_id=111, username="first", first_name="First")
+        self.assertIsNotNone(user.id)
+        self.assertEqual(user.username, "first")
+        
+        # Повторный вызов обновляет данные, но не создает дубликат
+        same_user = touch_user(self.session, telegram_id=111, username="renamed")
+        self.assertEqual(same_user.id, user.id)
+        self.assertEqual(same_user.username, "renamed")
+        self.assertEqual(same_user.first_name, "First")
+        self.assertEqual(self.session.query(User).filter(User.telegram_id == 111).count(), 1)
+    
+    def test_touch_users_batch(self):
+        """Тестирование пакетной записи активности пользователей."""
+        touch_user(self.session, telegram_id=111, username="first")
+        
+        count = touch_users(self.session, {
+            111: ("renamed", None, None),
+            222: ("second", "Second", None)
+        })
+        self.assertEqual(count, 2)
+        self.assertEqual(get_user_by_telegram_id(self.session, 111).username, "renamed")
+        self.assertIsNotNone(get_user_by_telegram_id(self.session, 222))
+    
+    def test_touch_users_keeps_activity_time(self):
+        """Тестирование сохранения времени активности из пакета."""
+        seen_at = datetime(2024, 1, 2, 3, 4, 5)
+        touch_users(self.session, {333: ("third", None, None, seen_at)})
+        
+        user = get_user_by_telegram_id(self.session, 333)
+        self.session.refresh(user)
+        self.assertEqual(user.last_activity.replace(tzinfo=None), seen_at)
+    
     def test_course_operations(self):
         """Тестирование операций с курсами."""
         # Создание курса
@@ -138,6 +181,66 @@ class TestDatabase(unittest.TestCase):
         self.assertIsNotNone(found_lesson)
         self.assertEqual(found_lesson.id, lesson.id)
     
+    def test_courses_progress(self):
+        """Тестирование подсчета прогресса по темам одним запросом."""
+        user = touch_user(self.session, telegram_id=111, username="first")
+        first = create_lesson(self.session, course_id=1, title="Урок 1", content="Текст", order=1)
+        create_lesson(self.session, course_id=1, title="Урок 2", content="Текст", order=2)
+        self.session.add(UserProgress(user_id=user.id, lesson_id=first.id, is_completed=True))
+        self.session.commit()
+        
+        progress = get_courses_progress(self.session, user.id)
+        self.assertAlmostEqual(progress[1], 50.0)
+        
+        # Прогресс другого пользователя не учитывается
+        other = touch_user(self.session, telegram_id=222, username="second")
+        self.assertAlmostEqual(get_courses_progress(self.session, other.id)[1], 0.0)
+    
+    def test_available_lessons_for_course(self):
+        """Тестирование выборки уроков одной темы вместе с прогрессом."""
+        user = touch_user(self.session, telegram_id=111, username="first")
+        second = create_lesson(self.session, course_id=1, title="Урок 2", content="Текст", order=2)
+        first = create_lesson(self.session, course_id=1, title="Урок 1", content="Текст", order=1)
+        create_lesson(self.session, course_id=2, title="Другая тема", content="Текст", order=1)
+        self.session.add(UserProgress(user_id=user.id, lesson_id=second.id, is_completed=True))
+        self.session.commit()
+        
+        data = get_available_lessons_for_course(self.session, user.id, 1)
+        self.assertEqual([item["lesson"].id for item in data], [first.id, second.id])
+        self.assertIsNone(data[0]["progress"])
+        self.assertTrue(data[1]["progress"].is_completed)
+    
+    def test_course_lessons_with_progress(self):
+        """Тестирование выборки уроков темы и прогресса одним JOIN."""
+        user = touch_user(self.session, telegram_id=111, username="first")
+        other = touch_user(self.session, telegram_id=222, username="second")
+        second = create_lesson(self.session, course_id=1, title="Урок 2", content="Текст", order=2)
+        first = create_lesson(self.session, course_id=1, title="Урок 1", content="Текст", order=1)
+        self.session.add(UserProgress(user_id=other.id, lesson_id=first.id, is_completed=True))
+        self.session.add(UserProgress(user_id=user.id, lesson_id=second.id, is_completed=True))
+        self.session.commit()
+        
+        rows = get_course_lessons_with_progress(self.session, 1, user.id)
+        self.assertEqual([lesson.id for lesson, _ in rows], [first.id, second.id])
+        # Прогресс другого пользователя не попадает в выборку
+        self.assertIsNone(rows[0][1])
+        self.assertEqual(rows[1][1].user_id, user.id)
+    
+    def test_record_test_result(self):
+        """Тестирование сохранения результата теста вместе с выборкой следующего урока."""
+        user = touch_user(self.session, telegram_id=111, username="first")
+        first = create_lesson(self.session, course_id=1, title="Урок 1", content="Текст", order=1)
+        second = create_lesson(self.session, course_id=1, title="Урок 2", content="Текст", order=2)
+        
+        next_lesson = record_test_result(self.session, user.id, first.id, True, 90.0)
+        self.assertEqual(next_lesson.id, second.id)
+        progress = get_user_progress(self.session, user.id, first.id)
+        self.assertTrue(progress.is_completed)
+        
+        # У последнего урока следующего нет, но результат сохраняется
+        self.assertIsNone(record_test_result(self.session, user.id, second.id, False, 40.0))
+        self.assertFalse(get_user_progress(self.session, user.id, second.id).is_completed)
+    
     def test_question_operations(self):
         """Тестирование операций с вопросами."""
         # Создание курса и урока